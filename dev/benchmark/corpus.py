@@ -0,0 +1,97 @@
+# =============================================================================
+# @file    corpus.py
+# @brief   Synthetic text corpus for benchmarking Urial's URI detection
+# @license Please see the file named LICENSE in the project directory
+# @website https://github.com/mhucka/urial
+#
+# The texts produced here are deterministic (they use a fixed random seed),
+# so that timings taken at different times can be compared meaningfully.
+# =============================================================================
+
+import random
+
+
+# Constants used later.
+# .............................................................................
+
+_WORDS = ('the of and to in is for on that with as by this from at are be'
+          ' source original note see document paper draft version copy'
+          ' review summary chapter figure table results methods data').split()
+
+_URIS = ['x-devonthink-item://8A1A0F18-068680226F3-4B1D-032FB186D85A',
+         'https://en.wikipedia.org/wiki/Bracket_(disambiguation)',
+         'http://wayback.archive.org/web/*/http://www.alexa.com/topsites',
+         'ldap://[2001:db8::7]/c=GB?a?b',
+         'tel:+1-816-555-1212',
+         'prefs:root=General&path=VPN/DNS',
+         'zotero://select/items/1_ABCD1234']
+
+_PUNCTUATION = ['.', ',', ';', ':', '?', '!']
+_WRAPPERS = [('(', ')'), ('[', ']'), ('<', '>'), ('"', '"'), ('', '')]
+
+
+# Corpus generators.
+# .............................................................................
+
+def devonthink_comment(rng):
+    '''Return text like a typical Finder comment written by DEVONthink users.'''
+    uri = rng.choice(_URIS[:1] + _URIS)
+    before = ' '.join(rng.choice(_WORDS) for _ in range(rng.randint(0, 8)))
+    after = ' '.join(rng.choice(_WORDS) for _ in range(rng.randint(0, 8)))
+    opener, closer = rng.choice(_WRAPPERS)
+    return f'{before} {opener}{uri}{closer}{rng.choice(_PUNCTUATION)} {after}'
+
+
+def prose(rng, length, uri_every = 50):
+    '''Return roughly length characters of prose, with URIs sprinkled in.'''
+    parts = []
+    size = 0
+    while size < length:
+        if rng.randrange(uri_every) == 0:
+            opener, closer = rng.choice(_WRAPPERS)
+            word = opener + rng.choice(_URIS) + closer
+        else:
+            word = rng.choice(_WORDS)
+        if rng.randrange(10) == 0:
+            word += rng.choice(_PUNCTUATION)
+        parts.append(word)
+        size += len(word) + 1
+    return ' '.join(parts)[:length]
+
+
+def many_chunks(count):
+    '''Return text with count short chunks, every tenth one a URI.'''
+    return ' '.join('a://b.c' if i % 10 == 0 else 'word' for i in range(count))
+
+
+def nested(depth):
+    '''Return a URI wrapped in depth levels of alternating ( and [.'''
+    opens = ''.join('([' [i % 2] for i in range(depth))
+    closes = ''.join(')]' [i % 2] for i in reversed(range(depth)))
+    return opens + 'x://a' + closes
+
+
+def unbalanced(depth):
+    '''Return a URI preceded by depth unmatched ( characters.'''
+    return '(' * depth + 'x://a'
+
+
+def trailing(count, tail = '.'):
+    '''Return a URI followed by count copies of the string tail.'''
+    return 'x://a' + tail * count
+
+
+def corpus():
+    '''Return a dict mapping case names to lists of texts.'''
+    rng = random.Random(20240101)
+    cases = {'devonthink-comments': [devonthink_comment(rng) for _ in range(200)]}
+    for length in [1000, 10000, 100000]:
+        cases[f'prose-{length}'] = [prose(rng, length)]
+    for count in [100, 10000]:
+        cases[f'chunks-{count}'] = [many_chunks(count)]
+    for depth in [10, 100, 1000, 10000]:
+        cases[f'nested-{depth}'] = [nested(depth)]
+        cases[f'unbalanced-{depth}'] = [unbalanced(depth)]
+        cases[f'trailing-dots-{depth}'] = [trailing(depth)]
+        cases[f'trailing-dot-parens-{depth}'] = [trailing(depth, '.)')]
+    return cases
@@ -0,0 +1,48 @@
+import os
+import sys
+
+try:
+    thisdir = os.path.dirname(os.path.abspath(__file__))
+    sys.path.append(os.path.join(thisdir, '..'))
+except:
+    sys.path.append('..')
+
+from urial.backends import MemoryStore
+
+
+# Helpers shared by several test modules.
+# .............................................................................
+
+class CountingStore(MemoryStore):
+    '''Memory store that counts reads and writes.
+
+    If fail_after is given, writing raises KeyboardInterrupt once that many
+    writes have been done, to simulate the program being interrupted.
+    '''
+
+    def __init__(self, comments = None, fail_after = None):
+        super().__init__(comments)
+        self.reads = 0
+        self.writes = 0
+        self.fail_after = fail_after
+
+    def read(self, file):
+        self.reads += 1
+        return super().read(file)
+
+    def write(self, file, comment):
+        if self.fail_after is not None and self.writes >= self.fail_after:
+            raise KeyboardInterrupt
+        self.writes += 1
+        super().write(file, comment)
+
+
+def make_files(folder, count):
+    '''Create count empty files in folder, and return a list of their paths.'''
+    folder.mkdir(parents = True, exist_ok = True)
+    files = []
+    for i in range(count):
+        path = folder / f'file{i:03}.txt'
+        path.write_text('')
+        files.append(str(path))
+    return files
@@ -0,0 +1,125 @@
+import asyncio
+import os
+import pytest
+import sys
+import threading
+import time
+
+try:
+    thisdir = os.path.dirname(os.path.abspath(__file__))
+    sys.path.append(os.path.join(thisdir, '..'))
+except:
+    sys.path.append('..')
+
+from urial.aio import AsyncComments
+from urial.backends import MemoryStore
+from conftest import make_files
+
+
+class LatencyStore(MemoryStore):
+    '''Memory store that takes a while to respond, and counts parallel calls.'''
+
+    def __init__(self, comments = None, latency = 0.05):
+        super().__init__(comments)
+        self.latency = latency
+        self.active = 0
+        self.max_active = 0
+        self.closed = False
+        self.lock = threading.Lock()
+
+    def _wait(self):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(self.latency)
+        with self.lock:
+            self.active -= 1
+
+    def read(self, file):
+        self._wait()
+        return super().read(file)
+
+    def write(self, file, comment):
+        self._wait()
+        super().write(file, comment)
+
+    def close(self):
+        self.closed = True
+
+
+def test_read_and_update(tmp_path):
+    file = make_files(tmp_path, 1)[0]
+    store = LatencyStore({file: 'x a://old y'}, latency = 0)
+
+    async def run():
+        async with AsyncComments(store) as comments:
+            assert await comments.read_comment(file) == 'x a://old y'
+            result = await comments.update_uri(file, 'a://new')
+            assert result == {'uri': 'a://new', 'action': 'replaced'}
+            await comments.write_comment(file, 'z')
+            assert await comments.read_comment(file) == 'z'
+
+    asyncio.run(run())
+    assert store.closed
+
+
+def test_reads_overlap_within_limit(tmp_path):
+    files = make_files(tmp_path, 40)
+    store = LatencyStore()
+
+    async def run():
+        async with AsyncComments(store, limit = 10) as comments:
+            return await asyncio.gather(*(comments.read_comment(f) for f in files))
+
+    started = time.perf_counter()
+    assert asyncio.run(run()) == [''] * 40
+    # Sequentially, this would take 40 * 0.05 = 2 s.
+    assert time.perf_counter() - started < 1
+    assert store.max_active == 10
+
+
+def test_update_many_back_pressure(tmp_path):
+    files = make_files(tmp_path, 30)
+    store = LatencyStore(latency = 0.01)
+    taken = []
+
+    def items():
+        for i, file in enumerate(files):
+            taken.append(file)
+            yield f'a://{i}', file
+        yield 'a://bad', str(tmp_path / 'missing')
+
+    async def run():
+        results = []
+        async with AsyncComments(store, limit = 4) as comments:
+            async for result in comments.update_many(items()):
+                if not results:
+                    # Items must not all be taken before any result is used.
+                    assert len(taken) <= 8
+                results.append(result)
+        return results
+
+    results = asyncio.run(run())
+    assert len(results) == 31
+    assert sum('error' in result for result in results) == 1
+    assert all(store.read(file) == f'a://{i}' for i, file in enumerate(files))
+    assert store.max_active <= 4
+
+
+def test_update_many_same_file(tmp_path):
+    file = make_files(tmp_path, 1)[0]
+    store = LatencyStore({file: 'note'}, latency = 0.02)
+    items = [('a://1', file), ('b://2', file), ('c://3', file)]
+
+    async def run():
+        async with AsyncComments(store, limit = 4) as comments:
+            return [result async for result in comments.update_many(items, 'append')]
+
+    results = asyncio.run(run())
+    assert [result['action'] for result in results] == ['appended'] * 3
+    assert store.read(file) == 'note\na://1\nb://2\nc://3'
+
+
+def test_invalid_limit():
+    with pytest.raises(ValueError):
+        AsyncComments(MemoryStore(), limit = 0)
@@ -0,0 +1,67 @@
+import os
+import plac
+import pytest
+import sys
+
+try:
+    thisdir = os.path.dirname(os.path.abspath(__file__))
+    sys.path.append(os.path.join(thisdir, '..'))
+except:
+    sys.path.append('..')
+
+from urial.backends import comment_store, JSONStore, MemoryStore, XattrStore
+from urial.__main__ import main
+
+
+def xattrs_supported(path):
+    try:
+        XattrStore().write(path, '')
+        return True
+    except (OSError, RuntimeError):
+        return False
+
+
+def test_memory_store(tmp_path):
+    store = comment_store('memory')
+    assert isinstance(store, MemoryStore)
+    assert store.read(tmp_path / 'f') == ''
+    store.write(tmp_path / 'f', 'a://b')
+    assert store.read(tmp_path / 'f') == 'a://b'
+
+
+def test_json_store(tmp_path):
+    path = str(tmp_path / 'comments.json')
+    store = comment_store('json:' + path)
+    assert isinstance(store, JSONStore)
+    store.write('somefile', 'a://b')
+    assert not os.path.exists(path)
+    store.close()
+    assert JSONStore(path).read('somefile') == 'a://b'
+
+
+def test_xattr_store(tmp_path):
+    file = tmp_path / 'f'
+    file.write_text('')
+    if not xattrs_supported(file):
+        pytest.skip('extended attributes are not supported here')
+    store = XattrStore()
+    assert store.read(file) == ''
+    store.write(file, 'x a://b ü')
+    assert store.read(file) == 'x a://b ü'
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        comment_store('json')
+
+
+def test_main_with_json_backend(tmp_path, capsys):
+    file = str(tmp_path / 'f')
+    open(file, 'w').close()
+    backend = 'json:' + str(tmp_path / 'comments.json')
+    with pytest.raises(SystemExit) as ex:
+        plac.call(main, ['-U', '-B', backend, 'a://b', file])
+    assert ex.value.code == 0
+    with pytest.raises(SystemExit):
+        plac.call(main, ['-U', '-B', backend, '-p', 'uri', file])
+    assert capsys.readouterr().out == 'a://b\n'
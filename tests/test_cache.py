@@ -0,0 +1,110 @@
+import json
+import os
+import plac
+import pytest
+import sys
+
+try:
+    thisdir = os.path.dirname(os.path.abspath(__file__))
+    sys.path.append(os.path.join(thisdir, '..'))
+except:
+    sys.path.append('..')
+
+from test_scanner import fuzz_corpus
+
+from urial.__main__ import main
+from urial.cache import ChunkCache
+from urial.scanner import uris_in_text, extracted_uri, set_cache, get_cache
+
+
+@pytest.fixture
+def cache():
+    cache = ChunkCache(maxsize = 50)
+    previous = set_cache(cache)
+    yield cache
+    set_cache(previous)
+
+
+def test_lru_eviction():
+    cache = ChunkCache(maxsize = 2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    assert cache.stats() == {'hits': 3, 'misses': 1, 'size': 2, 'maxsize': 2}
+    with pytest.raises(ValueError):
+        ChunkCache(maxsize = 0)
+
+
+@pytest.mark.parametrize('strict', [False, True])
+def test_results_unchanged_by_cache(cache, strict):
+    texts = fuzz_corpus(300)
+    expected = [uris_in_text(text, strict, 'classic') for text in texts]
+    # Twice, so that the second time many results come from the cache.
+    for _ in range(2):
+        assert [uris_in_text(text, strict) for text in texts] == expected
+    assert cache.hits > 0 and len(cache) <= 50
+    for _ in range(2):
+        assert extracted_uri('(a://b)', strict) == 'a://b'
+        assert extracted_uri('(a:)', strict) == ('a:' if strict else '')
+
+
+def test_hits_on_repeated_text(cache):
+    text = 'See x-devonthink-item://8A1A0F18 and https://example.org/p. ' * 10
+    uris_in_text(text)
+    assert (cache.hits, cache.misses) == (18, 2)
+
+
+def test_save_and_load(tmp_path, cache):
+    uris_in_text('a://b (c://d) e:')
+    path = str(tmp_path / 'cache.json')
+    cache.save(path)
+    loaded = ChunkCache.load(path)
+    assert len(loaded) == len(cache) == 3
+    assert loaded.get(('(c://d)', False)) == (1, 6, 'c')
+    assert loaded.get(('e:', False)) == (0, 1, None)
+    assert len(ChunkCache.load(path, maxsize = 1)) == 1
+    assert len(ChunkCache.load(str(tmp_path / 'nonexistent'))) == 0
+    with open(path) as f:
+        content = json.load(f)
+    content['version'] = '0.0.0'
+    with open(path, 'w') as f:
+        json.dump(content, f)
+    assert len(ChunkCache.load(path)) == 0
+
+
+@pytest.mark.parametrize('content', [[], {'version': '1'}, {'entries': {}},
+                                     {'entries': [['a://b', False, 0]]},
+                                     {'entries': [['a://b', False, 0, 'x', 'a']]}])
+def test_load_invalid(tmp_path, content):
+    from urial import __version__
+    path = tmp_path / 'cache.json'
+    if isinstance(content, dict) and 'entries' in content:
+        content['version'] = __version__
+    path.write_text(json.dumps(content))
+    with pytest.raises(ValueError):
+        ChunkCache.load(str(path))
+    with pytest.raises(SystemExit) as exit:
+        plac.call(main, ['-U', '-c', '-k', str(path), str(path)])
+    assert exit.value.code == 1
+
+
+def test_cache_option(tmp_path):
+    file = tmp_path / 'file.txt'
+    file.write_text('a://b a://b a://b c://d')
+    path = tmp_path / 'cache.json'
+    metrics = tmp_path / 'metrics.jsonl'
+    previous = get_cache()
+    try:
+        for _ in range(2):
+            with pytest.raises(SystemExit) as exit:
+                plac.call(main, ['-U', '-c', '-k', str(path), '-j', str(metrics),
+                                 str(file)])
+            assert exit.value.code == 0
+    finally:
+        set_cache(previous)
+    records = [json.loads(line) for line in metrics.read_text().splitlines()]
+    assert records[0]['cache'] == {'hits': 2, 'misses': 2, 'size': 2, 'maxsize': 100000}
+    assert records[1]['cache']['hits'] == 4
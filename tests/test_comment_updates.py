@@ -0,0 +1,109 @@
+import json
+import os
+import plac
+import pytest
+import sys
+
+try:
+    thisdir = os.path.dirname(os.path.abspath(__file__))
+    sys.path.append(os.path.join(thisdir, '..'))
+except:
+    sys.path.append('..')
+
+from urial.__main__ import main, batch_items, batch_groups
+from urial.comments import updated_comment, updated_comment_all, processed
+from conftest import CountingStore
+
+def test_updated_comment():
+    assert updated_comment('', 'a://b') == ('a://b', 'written')
+    assert updated_comment('x a://c y', 'a://b', 'overwrite') == ('a://b', 'overwritten')
+    assert updated_comment('x a://b y', 'a://b') == (None, 'unchanged')
+    assert updated_comment('x a://b y', 'a://b', 'append') == (None, 'unchanged')
+    assert updated_comment('x', 'a://b', 'append') == ('x\na://b', 'appended')
+    assert updated_comment('x', 'a://b', 'prepend') == ('a://b\nx', 'prepended')
+    assert updated_comment('x a://c y', 'a://b') == ('x a://b y', 'replaced')
+    assert updated_comment('x z://c y', 'a://b') == (None, 'unchanged')
+
+def test_batch_items(tmp_path):
+    source = tmp_path / 'pairs.txt'
+    source.write_text('a://b\tfile one\n'
+                      '\n'
+                      '# comment\n'
+                      '{"uri": "c://d", "file": "file two"}\n')
+    assert list(batch_items(str(source))) == [('a://b', 'file one'),
+                                              ('c://d', 'file two')]
+    source.write_text('file one\n{"file": "file two"}\n')
+    assert list(batch_items(str(source), show = True)) == [(None, 'file one'),
+                                                           (None, 'file two')]
+
+def test_batch_groups():
+    taken = []
+
+    def items():
+        for item in [('a://1', 'f'), ('a://2', 'g'), ('a://3', 'f')]:
+            taken.append(item)
+            yield item
+
+    # Each group must be yielded before the next item is read.
+    for group in batch_groups(items(), 1):
+        assert group == taken[-1:]
+    assert list(batch_groups(items(), 5)) == [[('a://1', 'f'), ('a://2', 'g')],
+                                              [('a://3', 'f')]]
+    assert len(list(batch_groups([('a://1', 'f'), ('a://2', './f')], 5))) == 2
+
+
+def test_updated_comment_all():
+    comment = 'see x://old and https://old.org/p.'
+    assert updated_comment_all(comment, ['x://new', 'https://new.org/q']) \
+        == ('see x://new and https://new.org/q.', ['replaced', 'replaced'])
+    assert updated_comment_all(comment, ['x://old', 'z://new']) \
+        == (None, ['unchanged', 'unchanged'])
+    assert updated_comment_all(comment, ['x://new', 'z://new'], 'append') \
+        == (comment + '\nx://new\nz://new', ['appended', 'appended'])
+    assert updated_comment_all(comment, ['x://new', 'z://new'], 'prepend') \
+        == ('x://new\nz://new\n' + comment, ['prepended', 'prepended'])
+    assert updated_comment_all('', ['x://a', 'y://b', 'x://a']) \
+        == ('x://a\ny://b', ['written', 'written', 'written'])
+    # A second URI of the same scheme replaces the next URI of that scheme.
+    assert updated_comment_all('x://1 x://2', ['x://a', 'x://b']) \
+        == ('x://a x://b', ['replaced', 'replaced'])
+
+def test_processed_many_uris(tmp_path):
+    file = tmp_path / 'file.txt'
+    file.write_text('')
+    store = CountingStore({str(file): 'x://old https://old.org'})
+    result = processed(store, str(file), ['x://new', 'https://new.org'],
+                       'update', False, False)
+    assert result == {'uri': ['x://new', 'https://new.org'],
+                      'action': ['replaced', 'replaced']}
+    assert (store.reads, store.writes) == (1, 1)
+    assert store.read(str(file)) == 'x://new https://new.org'
+    result = processed(store, str(file), ['x://new', 'https://new.org'],
+                       'update', False, False)
+    assert result['action'] == ['unchanged', 'unchanged']
+    assert store.writes == 1
+    # A URI given twice is added once, but gets an action for each time.
+    store.write(str(file), '')
+    result = processed(store, str(file), ['a://x', 'a://x'], 'update', False, False)
+    assert result == {'uri': ['a://x', 'a://x'], 'action': ['written', 'written']}
+    assert store.read(str(file)) == 'a://x'
+
+
+def test_batch_continues_after_bad_lines(tmp_path, capsys):
+    files = [str(tmp_path / 'one.txt'), str(tmp_path / 'two.txt')]
+    for file in files:
+        open(file, 'w').close()
+    comments = tmp_path / 'comments.json'
+    batch = tmp_path / 'pairs.txt'
+    batch.write_text(f'a://1\t{files[0]}\n'
+                     '{"uri": "a://2", "file": \n'
+                     '{"uri": "a://3", "file": ["x"]}\n'
+                     + json.dumps({'uri': 'a://4', 'file': files[1]}) + '\n')
+    with pytest.raises(SystemExit) as exit:
+        plac.call(main, ['-U', '-B', f'json:{comments}', '-b', str(batch)])
+    assert exit.value.code == 1
+    results = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [result.get('action') for result in results] == ['written', None, None,
+                                                            'written']
+    assert 'line 2' in results[1]['error'] and 'line 3' in results[2]['error']
+    assert json.loads(comments.read_text()) == {files[0]: 'a://1', files[1]: 'a://4'}
@@ -0,0 +1,253 @@
+import os
+import plac
+import pytest
+import sys
+import threading
+import types
+
+try:
+    thisdir = os.path.dirname(os.path.abspath(__file__))
+    sys.path.append(os.path.join(thisdir, '..'))
+except:
+    sys.path.append('..')
+
+from urial.__main__ import main
+from urial.client import request
+from urial.server import Server
+from urial.backends import comment_store, FinderStore
+from urial.tree import comments_of
+from conftest import make_files
+
+
+# A stand-in for the parts of appscript and mactypes used by FinderStore. It
+# keeps comments in a dict and counts the Apple Events that would be sent.
+# .............................................................................
+
+class FakeFinder():
+    def __init__(self):
+        self.comments = {}
+        self.events = 0
+        self.connections = 0
+        self.failing = set()
+        self.hidden = set()
+        self.items = Elements(self, None)
+        self.lock = threading.Lock()
+
+    def event(self, names):
+        with self.lock:
+            self.events += 1
+        if self.failing & set(names):
+            raise RuntimeError('Finder got an error')
+
+
+class Alias():
+    def __init__(self, path):
+        self.path = path
+
+
+class Property():
+    def __init__(self, getter, setter):
+        self.get, self.set = getter, setter
+
+    def __call__(self):
+        return self.get()
+
+
+class Elements():
+    def __init__(self, finder, folder):
+        self.finder, self.folder = finder, folder
+
+    def __getitem__(self, key):
+        if isinstance(key, Alias):
+            return Item(self.finder, key.path)
+        return Selection(self.finder, self.folder, key[1])
+
+
+class Item():
+    def __init__(self, finder, path):
+        self.finder, self.path = finder, path
+        self.items = Elements(finder, path)
+
+    @property
+    def comment(self):
+        def getter():
+            self.finder.event([os.path.basename(self.path)])
+            return self.finder.comments.get(self.path, '')
+
+        def setter(value):
+            self.finder.event([os.path.basename(self.path)])
+            self.finder.comments[self.path] = value
+        return Property(getter, setter)
+
+
+class Selection():
+    '''The items of a folder whose names are in a list.'''
+    def __init__(self, finder, folder, names):
+        self.finder, self.folder = finder, folder
+        wanted = set(names)
+        self.names = [name for name in sorted(os.listdir(folder))
+                      if name in wanted and name not in finder.hidden]
+
+    @property
+    def name(self):
+        def getter():
+            self.finder.event(self.names)
+            return list(self.names)
+        return Property(getter, None)
+
+    @property
+    def comment(self):
+        paths = [os.path.join(self.folder, name) for name in self.names]
+
+        def getter():
+            self.finder.event(self.names)
+            return [self.finder.comments.get(path, '') for path in paths]
+
+        def setter(value):
+            self.finder.event(self.names)
+            for path in paths:
+                self.finder.comments[path] = value
+        return Property(getter, setter)
+
+    @property
+    def properties(self):
+        def getter():
+            self.finder.event(self.names)
+            comments = self.finder.comments
+            return [{'name': name,
+                     'comment': comments.get(os.path.join(self.folder, name), '')}
+                    for name in self.names]
+        return Property(getter, None)
+
+
+@pytest.fixture
+def finder(monkeypatch):
+    finder = FakeFinder()
+
+    def app(name):
+        finder.connections += 1
+        return finder
+    name_field = types.SimpleNamespace(isin = lambda names: ('isin', list(names)))
+    appscript = types.SimpleNamespace(app = app,
+                                      its = types.SimpleNamespace(name = name_field),
+                                      k = types.SimpleNamespace(name = 'name',
+                                                                comment = 'comment'))
+    monkeypatch.setitem(sys.modules, 'appscript', appscript)
+    monkeypatch.setitem(sys.modules, 'mactypes', types.SimpleNamespace(Alias = Alias))
+    return finder
+
+
+# Tests.
+# .............................................................................
+
+def test_backend_names(finder):
+    assert comment_store('finder').batch_size == 1
+    assert comment_store('finder:50').batch_size == 50
+    with pytest.raises(ValueError):
+        comment_store('finder:x')
+
+
+def test_read_many(tmp_path, finder):
+    files = make_files(tmp_path / 'a', 60) + make_files(tmp_path / 'b', 40)
+    finder.comments = {file: f'x://{i}' for i, file in enumerate(files)}
+    expected = [(f'x://{i}', None) for i in range(100)]
+
+    finder.events = 0
+    assert FinderStore().read_many(files) == expected
+    assert finder.events == 100
+
+    finder.events = 0
+    assert FinderStore(batch_size = 50).read_many(files) == expected
+    # Folder a needs 2 batches and b needs 1, each taking 1 event.
+    assert finder.events == 3
+
+
+def test_read_many_falls_back_to_single_items(tmp_path, finder):
+    files = make_files(tmp_path, 10)
+    finder.comments = dict.fromkeys(files, 'x://a')
+    finder.failing = {'file003.txt'}
+    finder.hidden = {'file007.txt'}
+    finder.events = 0
+    results = FinderStore(batch_size = 5).read_many(files)
+    assert [comment for comment, _ in results] == ['x://a'] * 3 + [None] + ['x://a'] * 6
+    assert isinstance(results[3][1], RuntimeError)
+    assert all(error is None for i, (_, error) in enumerate(results) if i != 3)
+    # First batch: 1 failed event + 5 single reads. Second: 1 event + 1 single.
+    assert finder.events == 8
+
+
+def test_write_many(tmp_path, finder):
+    files = make_files(tmp_path, 6)
+    store = FinderStore(batch_size = 10)
+    finder.events = 0
+    pairs = [(file, 'x://same') for file in files[:4]] + [(files[4], 'x://4'),
+                                                          (files[5], 'x://5')]
+    assert store.write_many(pairs) == [None] * 6
+    # 2 events to find and set the 4 files with the same comment, + 2 singles.
+    assert finder.events == 4
+    assert [finder.comments[file] for file in files[4:]] == ['x://4', 'x://5']
+    assert all(finder.comments[file] == 'x://same' for file in files[:4])
+    finder.failing = {'file001.txt'}
+    errors = store.write_many([(file, 'y://same') for file in files[:3]])
+    assert errors[0] is None and errors[2] is None
+    assert isinstance(errors[1], RuntimeError)
+    assert finder.comments[files[2]] == 'y://same'
+
+
+def test_write_many_falls_back_for_unmatched_files(tmp_path, finder):
+    files = make_files(tmp_path, 4)
+    # Finder's selection by name won't match this file, but the file can
+    # still be reached directly by its path.
+    finder.hidden = {'file002.txt'}
+    finder.events = 0
+    assert FinderStore(batch_size = 10).write_many([(file, 'x://a') for file in files]) \
+        == [None] * 4
+    assert all(finder.comments[file] == 'x://a' for file in files)
+    assert finder.events == 3
+
+
+def test_comments_of_uses_batches(tmp_path, finder):
+    files = make_files(tmp_path, 30)
+    finder.events = 0
+    results = list(comments_of(FinderStore(batch_size = 10), iter(files), workers = 2))
+    assert sorted(file for file, _, _ in results) == files
+    assert finder.events == 3
+
+
+def test_batch_mode_with_batched_finder(tmp_path, finder):
+    files = make_files(tmp_path, 20)
+    finder.comments = {files[0]: 'note x://old'}
+    batch = tmp_path / 'pairs.tsv'
+    batch.write_text(''.join(f'x://{i}\t{file}\n' for i, file in enumerate(files))
+                     + f'x://0\t{files[0]}\n')
+    finder.events = 0
+    with pytest.raises(SystemExit) as exit:
+        plac.call(main, ['-U', '-B', 'finder:100', '-b', str(batch)])
+    assert exit.value.code == 0
+    # 1 event to read the first 20 comments and 20 to write them, then the
+    # repeated file starts a new batch: 1 event to read, and no write.
+    assert finder.events == 22
+    assert finder.comments[files[0]] == 'note x://0'
+    assert finder.comments[files[19]] == 'x://19'
+
+
+def test_connections(tmp_path, finder):
+    files = make_files(tmp_path, 30)
+    store = FinderStore()
+    assert finder.connections == 1
+    # The server handles each client on a new thread, but should keep using
+    # the same connection to Finder.
+    server = Server(str(tmp_path / 's'), store)
+    thread = threading.Thread(target = server.serve_forever, daemon = True)
+    thread.start()
+    try:
+        for file in files[:3]:
+            assert request(server.server_address, uri = 'a://b', file = file) \
+                == {'file': file, 'uri': 'a://b', 'action': 'written'}
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert finder.connections == 1
+    # Threads reading comments concurrently get their own connections.
+    assert len(list(comments_of(store, iter(files), workers = 2))) == 30
+    assert 1 < finder.connections <= 3
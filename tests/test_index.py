@@ -0,0 +1,59 @@
+import os
+import pytest
+import sys
+
+try:
+    thisdir = os.path.dirname(os.path.abspath(__file__))
+    sys.path.append(os.path.join(thisdir, '..'))
+except:
+    sys.path.append('..')
+
+from urial.index import URIIndex
+from conftest import CountingStore
+
+
+@pytest.fixture
+def files(tmp_path):
+    paths = {}
+    for name, comment in [('a', 'see x://1 and y://2.'), ('b', 'x://1'), ('c', ''),
+                          ('sub/d', '(x://3)')]:
+        path = tmp_path / 'tree' / name
+        path.parent.mkdir(parents = True, exist_ok = True)
+        path.write_text('')
+        paths[name] = (str(path), comment)
+    return paths
+
+
+def test_refresh_and_lookup(tmp_path, files):
+    store = CountingStore({path: comment for path, comment in files.values()})
+    root = str(tmp_path / 'tree')
+    with URIIndex(str(tmp_path / 'index.db')) as index:
+        stats = index.refresh(store, [root])
+        assert stats == {'read': 4, 'unchanged': 0, 'removed': 0, 'failed': 0}
+        assert index.files_with('x://1') == [files['a'][0], files['b'][0]]
+        assert index.files_with('x://3') == [files['sub/d'][0]]
+        assert index.files_with('z://nope') == []
+        assert index.uris_of(files['a'][0]) == ['x://1', 'y://2']
+
+        # Nothing changed, so nothing should be read.
+        stats = index.refresh(store, [root])
+        assert stats == {'read': 0, 'unchanged': 4, 'removed': 0, 'failed': 0}
+        assert store.reads == 4
+
+        # Change a comment (and the file's times, as setting comments does),
+        # and remove a file.
+        path_b = files['b'][0]
+        store.write(path_b, 'z://9')
+        os.utime(path_b, ns = (1, 1))
+        os.unlink(files['c'][0])
+        stats = index.refresh(store, [root])
+        assert stats == {'read': 1, 'unchanged': 2, 'removed': 1, 'failed': 0}
+        assert index.files_with('x://1') == [files['a'][0]]
+        assert index.files_with('z://9') == [path_b]
+
+    # The index persists between uses.
+    with URIIndex(str(tmp_path / 'index.db')) as index:
+        assert index.files_with('z://9') == [path_b]
+        # Changing strictness causes everything to be read again.
+        stats = index.refresh(store, [root], strict = True)
+        assert stats['read'] == 3
@@ -0,0 +1,135 @@
+import json
+import os
+import plac
+import pytest
+import sys
+
+try:
+    thisdir = os.path.dirname(os.path.abspath(__file__))
+    sys.path.append(os.path.join(thisdir, '..'))
+except:
+    sys.path.append('..')
+
+from urial.__main__ import main
+from urial.backends import MemoryStore
+from urial.migrate import URIMapping, migrated_comment
+from urial.plan import read_plan
+
+
+def test_mapping_lookup():
+    mapping = URIMapping([('a://old', 'a://new'),
+                          ('https://old.org/*', 'https://new.org/*'),
+                          ('https://old.org/deep/*', 'https://deep.org/')])
+    assert len(mapping) == 3
+    assert mapping.lookup('a://old') == 'a://new'
+    assert mapping.lookup('a://old/x') is None
+    assert mapping.lookup('https://old.org/x/y') == 'https://new.org/x/y'
+    # The longest matching prefix wins.
+    assert mapping.lookup('https://old.org/deep/z') == 'https://deep.org/z'
+    assert mapping.lookup('https://old.org') is None
+
+
+def test_migrated_comment():
+    mapping = URIMapping([('a://1', 'a://one'), ('b://2', 'b://two')])
+    comment = 'see a://1, then (b://2) and c://3; again a://1.'
+    new, changes = migrated_comment(comment, mapping)
+    assert new == 'see a://one, then (b://two) and c://3; again a://one.'
+    assert changes == [('a://1', 'a://one'), ('b://2', 'b://two'),
+                       ('a://1', 'a://one')]
+    assert migrated_comment('nothing c://3 here', mapping) == (None, [])
+
+
+def test_large_mapping(tmp_path):
+    map_file = tmp_path / 'map.tsv'
+    with open(map_file, 'w') as f:
+        for i in range(100_000):
+            f.write(f'x-devonthink-item://{i:08X}-OLD\tx-devonthink-item://{i:08X}-NEW\n')
+        f.write('# prefixes\n{"old": "https://a.org/*", "new": "https://b.org/*"}\n')
+    mapping = URIMapping.from_file(str(map_file))
+    assert len(mapping) == 100_001
+    comment = 'x-devonthink-item://0001869F-OLD https://a.org/p'
+    assert migrated_comment(comment, mapping)[0] \
+        == 'x-devonthink-item://0001869F-NEW https://b.org/p'
+
+
+def test_bad_mapping_file(tmp_path):
+    map_file = tmp_path / 'map.tsv'
+    map_file.write_text('a://old\n')
+    with pytest.raises(ValueError):
+        URIMapping.from_file(str(map_file))
+
+
+def test_migrate_option(tmp_path):
+    (tmp_path / 'sub').mkdir()
+    files = [str(tmp_path / 'one.txt'), str(tmp_path / 'sub' / 'two.txt'),
+             str(tmp_path / 'sub' / 'three.txt')]
+    for file in files:
+        open(file, 'w').close()
+    comments = tmp_path / 'comments.json'
+    original = {files[0]: 'a://1 and a://2', files[1]: 'x b://old/p', files[2]: 'c://3'}
+    comments.write_text(json.dumps(original))
+    map_file = tmp_path / 'map.tsv'
+    map_file.write_text('a://1\ta://one\na://2\ta://two\nb://old/*\tb://new/*\n')
+    backend = f'json:{comments}'
+
+    plan_file = str(tmp_path / 'plan.jsonl')
+    with pytest.raises(SystemExit) as exit:
+        plac.call(main, ['-U', '-B', backend, '-g', str(map_file), '-P', plan_file,
+                         str(tmp_path)])
+    assert exit.value.code == 0
+    assert json.loads(comments.read_text()) == original
+    assert {entry['file'] for entry in read_plan(plan_file)} == set(files[:2])
+
+    with pytest.raises(SystemExit) as exit:
+        plac.call(main, ['-U', '-B', backend, '-g', str(map_file), str(tmp_path)])
+    assert exit.value.code == 0
+    assert json.loads(comments.read_text()) == {files[0]: 'a://one and a://two',
+                                                files[1]: 'x b://new/p',
+                                                files[2]: 'c://3'}
+
+
+def test_migrate_continues_after_write_errors(tmp_path, monkeypatch, capsys):
+    files = [str(tmp_path / f'{name}.txt') for name in ['one', 'two', 'three']]
+    for file in files:
+        open(file, 'w').close()
+
+    class LockedStore(MemoryStore):
+        def write(self, file, comment):
+            if file.endswith('two.txt'):
+                raise PermissionError('file is locked')
+            super().write(file, comment)
+
+    store = LockedStore(dict.fromkeys(files, 'a://1'))
+    monkeypatch.setattr('urial.backends.comment_store', lambda backend: store)
+    map_file = tmp_path / 'map.tsv'
+    map_file.write_text('a://1\ta://one\n')
+    with pytest.raises(SystemExit) as exit:
+        plac.call(main, ['-U', '-g', str(map_file), str(tmp_path)])
+    assert exit.value.code == 1
+    assert [store.read(file) for file in files] == ['a://one', 'a://1', 'a://one']
+    output = capsys.readouterr()
+    assert 'two.txt: file is locked' in output.err
+    assert 'Migrated 2 URIs in 2 files.' in output.out
+
+
+def test_migrate_plan_with_relative_paths(tmp_path, monkeypatch):
+    (tmp_path / 'd').mkdir()
+    file = str(tmp_path / 'd' / 'one.txt')
+    open(file, 'w').close()
+    comments = tmp_path / 'comments.json'
+    comments.write_text(json.dumps({file: 'a://1'}))
+    map_file = tmp_path / 'map.tsv'
+    map_file.write_text('a://1\ta://one\n')
+    backend = f'json:{comments}'
+    plan_file = str(tmp_path / 'plan.jsonl')
+    monkeypatch.chdir(tmp_path)
+    with pytest.raises(SystemExit) as exit:
+        plac.call(main, ['-U', '-B', backend, '-g', str(map_file), '-P', plan_file, 'd'])
+    assert exit.value.code == 0
+    assert [entry['file'] for entry in read_plan(plan_file)] == [file]
+    # Apply the plan from somewhere else.
+    monkeypatch.chdir(tmp_path / 'd')
+    with pytest.raises(SystemExit) as exit:
+        plac.call(main, ['-U', '-B', backend, '-A', plan_file])
+    assert exit.value.code == 0
+    assert json.loads(comments.read_text()) == {file: 'a://one'}
@@ -0,0 +1,148 @@
+import json
+import os
+import plac
+import pytest
+import sys
+
+try:
+    thisdir = os.path.dirname(os.path.abspath(__file__))
+    sys.path.append(os.path.join(thisdir, '..'))
+except:
+    sys.path.append('..')
+
+from urial.__main__ import main
+from urial.comments import processed
+from urial.plan import make_plan, write_plan, read_plan, apply_plan, \
+    rollback_plan, journal_path
+from conftest import CountingStore, make_files
+
+
+def test_no_op_writes_are_skipped(tmp_path):
+    file = make_files(tmp_path, 1)[0]
+    store = CountingStore({file: 'a://b'})
+    result = processed(store, file, 'a://b', 'overwrite', False, False)
+    assert result['action'] == 'unchanged'
+    assert store.writes == 0
+
+
+def test_make_plan(tmp_path):
+    files = make_files(tmp_path, 3)
+    store = CountingStore({files[0]: 'x a://old y', files[1]: 'a://b'})
+    items = [('a://b', files[0]), ('c://d', files[0]), ('a://b', files[1]),
+             ('a://b', files[2]), ('a://b', str(tmp_path / 'missing'))]
+    plan, errors = make_plan(store, items, 'update')
+    assert store.writes == 0
+    assert [entry['file'] for entry in plan] == [files[0], files[2]]
+    assert plan[0]['old'] == 'x a://old y'
+    assert plan[0]['new'] == 'x a://b y'
+    assert plan[0]['actions'] == ['replaced']
+    assert plan[1]['new'] == 'a://b'
+    assert len(errors) == 1
+
+
+def test_apply_resume_and_rollback(tmp_path):
+    files = make_files(tmp_path, 5)
+    store = CountingStore({file: '' for file in files}, fail_after = 2)
+    plan, _ = make_plan(store, [(f'a://{i}', file) for i, file in enumerate(files)])
+    plan_file = str(tmp_path / 'plan.jsonl')
+    write_plan(plan, plan_file)
+    assert len(list(read_plan(plan_file))) == 5
+
+    # Interrupt partway through, then resume.
+    with pytest.raises(KeyboardInterrupt):
+        apply_plan(store, plan_file)
+    assert os.path.exists(journal_path(plan_file))
+    store.fail_after = None
+    stats = apply_plan(store, plan_file)
+    assert stats == {'written': 3, 'skipped': 0, 'conflicts': 0, 'failed': 0}
+    assert store.writes == 5
+    assert all(store.read(file) == f'a://{i}' for i, file in enumerate(files))
+    assert apply_plan(store, plan_file) \
+        == {'written': 0, 'skipped': 5, 'conflicts': 0, 'failed': 0}
+
+    # Someone else changes a file; it must be left alone by the rollback.
+    store.write(files[3], 'changed')
+    stats = rollback_plan(store, plan_file)
+    assert stats == {'restored': 4, 'conflicts': 1, 'failed': 0}
+    assert store.read(files[0]) == ''
+    assert store.read(files[3]) == 'changed'
+    assert not os.path.exists(journal_path(plan_file))
+
+
+def test_apply_skips_conflicts(tmp_path):
+    files = make_files(tmp_path, 2)
+    store = CountingStore()
+    plan, _ = make_plan(store, [('a://b', file) for file in files])
+    plan_file = str(tmp_path / 'plan.jsonl')
+    write_plan(plan, plan_file)
+    store.write(files[1], 'changed')
+    assert apply_plan(store, plan_file) \
+        == {'written': 1, 'skipped': 0, 'conflicts': 1, 'failed': 0}
+    assert store.read(files[1]) == 'changed'
+    # The file that was not written is not a conflict when rolling back.
+    assert rollback_plan(store, plan_file) \
+        == {'restored': 1, 'conflicts': 0, 'failed': 0}
+    assert store.read(files[1]) == 'changed'
+
+
+def test_apply_continues_after_errors(tmp_path):
+    files = make_files(tmp_path, 3)
+
+    class FailingStore(CountingStore):
+        missing = set()
+
+        def read(self, file):
+            if file in self.missing:
+                raise FileNotFoundError(f'No such file: {file}')
+            return super().read(file)
+
+    store = FailingStore()
+    plan, _ = make_plan(store, [('a://b', file) for file in files])
+    plan_file = str(tmp_path / 'plan.jsonl')
+    write_plan(plan, plan_file)
+    store.missing = {files[1]}
+    assert apply_plan(store, plan_file) \
+        == {'written': 2, 'skipped': 0, 'conflicts': 0, 'failed': 1}
+    assert [store.comments.get(file) for file in files] == ['a://b', None, 'a://b']
+    # The file that failed is tried again next time.
+    store.missing = set()
+    assert apply_plan(store, plan_file) \
+        == {'written': 1, 'skipped': 2, 'conflicts': 0, 'failed': 0}
+
+
+def test_plan_and_apply_options(tmp_path, capsys):
+    files = make_files(tmp_path, 2)
+    comments = tmp_path / 'comments.json'
+    backend = f'json:{comments}'
+    comments.write_text(json.dumps({files[0]: 'x a://old'}))
+    batch = tmp_path / 'pairs.tsv'
+    batch.write_text(''.join(f'a://new\t{file}\n' for file in files))
+    plan_file = str(tmp_path / 'plan.jsonl')
+
+    with pytest.raises(SystemExit) as exit:
+        plac.call(main, ['-U', '-B', backend, '-b', str(batch), '-P', plan_file])
+    assert exit.value.code == 0
+    assert json.loads(comments.read_text()) == {files[0]: 'x a://old'}
+    assert len(list(read_plan(plan_file))) == 2
+
+    with pytest.raises(SystemExit) as exit:
+        plac.call(main, ['-U', '-B', backend, '-A', plan_file])
+    assert exit.value.code == 0
+    assert json.loads(comments.read_text()) == {files[0]: 'x a://new',
+                                                files[1]: 'a://new'}
+
+    with pytest.raises(SystemExit) as exit:
+        plac.call(main, ['-U', '-B', backend, '-A', plan_file, '-u'])
+    assert exit.value.code == 0
+    assert json.loads(comments.read_text()) == {files[0]: 'x a://old',
+                                                files[1]: ''}
+
+
+@pytest.mark.parametrize('options', [['-g', 'map.tsv'], ['-r', '-p', 'uri'], ['-P', 'p2']])
+def test_apply_option_conflicts(tmp_path, capsys, options):
+    plan_file = tmp_path / 'plan.jsonl'
+    plan_file.write_text('')
+    with pytest.raises(SystemExit) as exit:
+        plac.call(main, ['-U', '-A', str(plan_file), *options])
+    assert exit.value.code == 1
+    assert 'cannot be combined' in capsys.readouterr().out
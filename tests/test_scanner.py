@@ -0,0 +1,120 @@
+import os
+import pytest
+import random
+import sys
+
+try:
+    thisdir = os.path.dirname(os.path.abspath(__file__))
+    sys.path.append(os.path.join(thisdir, '..'))
+except:
+    sys.path.append('..')
+
+from urial.scanner import uris_in_text, iter_uris, extracted_uri, unsurrounded, scan_many
+from urial.scanner import _classic_extracted_uri, _classic_unsurrounded
+
+# Characters that exercise the rules for trimming and splitting chunks.
+ALPHABET = 'abxyz19:/.-+#@%?!$,;\'()[]<>{}|^`"\\ \t\n=*~_é\xa0'
+
+def fuzz_corpus(count, seed = 1):
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(count):
+        length = rng.randint(0, 40)
+        corpus.append(''.join(rng.choice(ALPHABET) for _ in range(length)))
+    # Common URI-like fragments combined with punctuation and nesting.
+    pieces = ['a://b.c', 'x-devonthink-item://8A1A-06', 'tel:+1-816', 'a:',
+              '(', ')', '[', ']', '.', '?', ' ', 'ldap://[2001:db8::7]/c', ':']
+    for _ in range(count):
+        corpus.append(''.join(rng.choice(pieces) for _ in range(rng.randint(1, 12))))
+    return corpus
+
+
+def test_classic_engine_passes_unit_tests(monkeypatch):
+    import test_uri_parsing
+    monkeypatch.setattr(test_uri_parsing, 'uris_in_text',
+                        lambda text, strict = False: uris_in_text(text, strict, 'classic'))
+    test_uri_parsing.test_uris_in_text()
+
+
+@pytest.mark.parametrize('strict', [False, True])
+def test_engines_agree_on_fuzz_corpus(strict):
+    for text in fuzz_corpus(3000):
+        assert uris_in_text(text, strict, 'linear') == uris_in_text(text, strict, 'classic'), text
+        assert extracted_uri(text, strict) == _classic_extracted_uri(text, strict), text
+        assert unsurrounded(text) == _classic_unsurrounded(text), text
+
+
+@pytest.mark.parametrize('strict', [False, True])
+def test_engines_agree_on_adversarial_input(strict):
+    for n in [1, 2, 10, 100]:
+        for text in ['('*n + 'x://a' + ')'*n,
+                     '('*n + 'x://a' + ')'*(n - 1),
+                     '[('*n + 'x://a' + ')]'*n + '.',
+                     'x://a' + '.'*n,
+                     'x://a' + '.)'*n,
+                     'x://(a' + ')'*n + '?'*n,
+                     '('*n]:
+            assert uris_in_text(text, strict, 'linear') == uris_in_text(text, strict, 'classic')
+
+
+def test_iter_uris():
+    text = 'see (a://b.c), then [x-y:z?q].'
+    matches = list(iter_uris(text))
+    assert [m.uri for m in matches] == ['a://b.c', 'x-y:z?q']
+    assert [text[m.start:m.end] for m in matches] == ['a://b.c', 'x-y:z?q']
+    assert [m.scheme for m in matches] == ['a', 'x-y']
+    for text in fuzz_corpus(500):
+        for strict in [False, True]:
+            matches = list(iter_uris(text, strict))
+            assert [m.uri for m in matches] == uris_in_text(text, strict)
+            assert all(text[m.start:m.end] == m.uri for m in matches)
+
+
+@pytest.mark.parametrize('strict', [False, True])
+def test_scan_many(strict, monkeypatch):
+    texts = fuzz_corpus(300) * 2 + ['', 'a://b']
+    expected = [uris_in_text(text, strict) for text in texts]
+    with monkeypatch.context() as patch:
+        # A process pool must only be used if asked for.
+        patch.setattr('concurrent.futures.ProcessPoolExecutor', None)
+        assert scan_many(texts, strict, threshold = 10) == expected
+    assert scan_many(iter(texts), strict, processes = 1) == expected
+    # Force the use of a process pool.
+    assert scan_many(texts, strict, processes = 2, threshold = 10) == expected
+    results = scan_many(['a://b', 'a://b'])
+    results[0].append('x')
+    assert results[1] == ['a://b']
+
+
+def test_unknown_engine():
+    with pytest.raises(ValueError):
+        uris_in_text('a://b', engine = 'nonesuch')
+
+
+@pytest.mark.parametrize('make_text', [lambda n: '('*n + 'x://a' + ')'*n,
+                                       lambda n: '('*n + 'x://a',
+                                       lambda n: 'x://a' + '.)'*n])
+def test_linear_engine_scales_linearly(make_text):
+    from timeit import Timer
+    def best_time(text):
+        return min(Timer(lambda: uris_in_text(text)).repeat(5, 1))
+    small, large = best_time(make_text(2000)), best_time(make_text(32000))
+    # The input grows by 16x; quadratic behavior would take ~256x as long.
+    assert large < 64 * small
+
+
+@pytest.mark.parametrize('strict', [False, True])
+def test_scheme_filter(strict):
+    def scheme_of(uri):
+        return uri.partition(':')[0].lower()
+    texts = fuzz_corpus(500) + ['see A://B and a://c, (HTTP://x) b:a://d',
+                                'x-devonthink-item:x-devonthink-item://y']
+    for scheme in ['a', 'A', 'x-devonthink-item', 'tel', 'ldap', 'b', 'nonesuch', 'a b']:
+        for text in texts:
+            expected = [uri for uri in uris_in_text(text, strict)
+                        if scheme_of(uri) == scheme.lower()]
+            assert uris_in_text(text, strict, scheme = scheme) == expected
+            assert uris_in_text(text, strict, 'classic', scheme) == expected
+            assert [m.uri for m in iter_uris(text, strict, scheme)] == expected
+    assert uris_in_text('see A://B and a://c', scheme = 'a') == ['A://B', 'a://c']
+    assert scan_many(['a://b c://d', 'c://e'], scheme = 'c') == [['c://d'], ['c://e']]
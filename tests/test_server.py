@@ -0,0 +1,48 @@
+import os
+import pytest
+import sys
+import threading
+
+try:
+    thisdir = os.path.dirname(os.path.abspath(__file__))
+    sys.path.append(os.path.join(thisdir, '..'))
+except:
+    sys.path.append('..')
+
+from urial.backends import MemoryStore
+from urial.client import request, main as client_main
+from urial.server import Server
+
+
+@pytest.fixture
+def server(tmp_path):
+    socket_path = str(tmp_path / 's')
+    server = Server(socket_path, MemoryStore())
+    thread = threading.Thread(target = server.serve_forever, daemon = True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_requests(server, tmp_path):
+    file = str(tmp_path / 'f')
+    open(file, 'w').close()
+    sock = server.server_address
+    assert request(sock, uri = 'a://b', file = file) \
+        == {'file': file, 'uri': 'a://b', 'action': 'written'}
+    assert request(sock, uri = 'a://c', file = file, mode = 'append') \
+        == {'file': file, 'uri': 'a://c', 'action': 'appended'}
+    assert request(sock, file = file, print = 'uri') == {'file': file, 'uris': ['a://b', 'a://c']}
+    assert server.store.read(file) == 'a://b\na://c'
+    assert 'error' in request(sock, uri = 'a://b', file = file, mode = 'bogus')
+    assert 'error' in request(sock, uri = 'a://b', file = str(tmp_path / 'nonexistent'))
+
+
+def test_client(server, tmp_path, capsys):
+    file = str(tmp_path / 'f')
+    open(file, 'w').close()
+    assert client_main(['-S', server.server_address, 'a://b', file]) == 0
+    assert client_main(['-S', server.server_address, '-p', 'comment', file]) == 0
+    assert capsys.readouterr().out == 'a://b\n'
+    assert client_main(['-S', server.server_address, 'a://b', 'nonexistent']) == 1
@@ -0,0 +1,58 @@
+import os
+import pytest
+import subprocess
+import sys
+
+try:
+    thisdir = os.path.dirname(os.path.abspath(__file__))
+    sys.path.append(os.path.join(thisdir, '..'))
+except:
+    sys.path.append('..')
+
+# Maximum total time (in ms) to import modules on the path that only reads a
+# comment and prints the URIs in it. This is several times what it takes on a
+# typical development machine, so that slow CI machines don't fail the test,
+# while still catching the reintroduction of a heavy import.
+IMPORT_BUDGET_MS = 150
+
+# Modules that no path tested here should need.
+HEAVY_MODULES = ['plac_ext', 'plac_tk', 'tkinter', 'multiprocessing', 'asyncio',
+                 'sqlite3', 'concurrent.futures', 'appscript', 'urial.server']
+
+
+def import_times(*args):
+    '''Run urial with -X importtime and return {module: cumulative µs}.'''
+    repo = os.path.join(thisdir, '..')
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-m', 'urial', *args],
+                          cwd = repo, capture_output = True, text = True)
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Names are preceded by a space, plus 2 more per level of nesting.
+        times[name[1:].rstrip()] = int(cumulative)
+    return times
+
+
+def total_ms(times):
+    # Top-level entries (not indented) include the time of nested imports.
+    return sum(us for name, us in times.items() if not name.startswith(' ')) / 1000
+
+
+def test_version_imports(tmp_path):
+    times = import_times('-V')
+    names = {name.strip() for name in times}
+    assert not names & {'uritools', 'urial.scanner', 'urial.backends', *HEAVY_MODULES}
+
+
+def test_scan_path_import_budget(tmp_path):
+    file = tmp_path / 'f'
+    file.write_text('')
+    store = tmp_path / 'comments.json'
+    store.write_text('{"%s": "see x://y."}' % file)
+    times = import_times('-U', '-B', f'json:{store}', '-p', 'uri', str(file))
+    names = {name.strip() for name in times}
+    assert 'urial.scanner' in names
+    assert not names & set(HEAVY_MODULES)
+    assert total_ms(times) < IMPORT_BUDGET_MS
@@ -0,0 +1,82 @@
+import io
+import os
+import pytest
+import sys
+
+try:
+    thisdir = os.path.dirname(os.path.abspath(__file__))
+    sys.path.append(os.path.join(thisdir, '..'))
+except:
+    sys.path.append('..')
+
+from test_scanner import fuzz_corpus
+
+from urial.scanner import uris_in_text
+from urial.stream import scan_file, scan_stream
+
+
+TEXTS = ['',
+         'x://a',
+         '(x://a)',
+         '((x://a b://c))',
+         '(x://a(b) c://d)',
+         '[see x://a] and y://b.',
+         'ünïcödé x://ä/ö and y://b/é\n' * 20,
+         'line one x-devonthink-item://8A1A0F18-068680226F3.\n' * 50]
+
+
+@pytest.mark.parametrize('strict', [False, True])
+@pytest.mark.parametrize('block_size', [1, 7, 64, 1 << 20])
+def test_same_as_uris_in_text(tmp_path, strict, block_size):
+    path = tmp_path / 'text.txt'
+    for text in TEXTS + [' '.join(fuzz_corpus(200))] + fuzz_corpus(50):
+        expected = uris_in_text(text, strict)
+        data = text.encode('utf-8')
+        path.write_bytes(data)
+        assert list(scan_file(str(path), strict, block_size)) == expected
+        assert list(scan_stream(io.BytesIO(data), strict, block_size)) == expected
+
+
+def test_large_file(tmp_path):
+    path = tmp_path / 'big.log'
+    line = 'INFO fetched https://example.org/item/{} (status 200); next: x://{}.\n'
+    with open(path, 'w') as f:
+        for i in range(50_000):
+            f.write(line.format(i, i))
+    uris = scan_file(str(path), block_size = 4096)
+    assert next(uris) == 'https://example.org/item/0'
+    assert sum(1 for _ in uris) == 99_999
+
+
+def test_scan_option(tmp_path, capsys):
+    import plac
+    from urial.__main__ import main
+    one, two = tmp_path / 'one.txt', tmp_path / 'two.txt'
+    one.write_text('see (x://a), then y://b.')
+    two.write_text('z://c')
+    with pytest.raises(SystemExit) as exit:
+        plac.call(main, ['-U', '-c', str(one)])
+    assert exit.value.code == 0
+    assert capsys.readouterr().out == 'x://a\ny://b\n'
+    with pytest.raises(SystemExit) as exit:
+        plac.call(main, ['-U', '-c', str(one), str(two)])
+    assert exit.value.code == 0
+    assert capsys.readouterr().out == f'{one}\tx://a\n{one}\ty://b\n{two}\tz://c\n'
+    with pytest.raises(SystemExit) as exit:
+        plac.call(main, ['-U', '-c', '-e', 'Y', str(one), str(two)])
+    assert exit.value.code == 0
+    assert capsys.readouterr().out == f'{one}\ty://b\n'
+    assert list(scan_file(str(one), scheme = 'x', block_size = 3)) == ['x://a']
+
+
+@pytest.mark.parametrize('options', [['-r', '-p', 'uri'], ['-S', 'sock'], ['-A', 'plan'],
+                                     ['-P', 'plan'], ['-u']])
+def test_scan_option_conflicts(tmp_path, capsys, options):
+    import plac
+    from urial.__main__ import main
+    one = tmp_path / 'one.txt'
+    one.write_text('x://a')
+    with pytest.raises(SystemExit) as exit:
+        plac.call(main, ['-U', '-c', *options, str(one)])
+    assert exit.value.code == 1
+    assert 'cannot be combined' in capsys.readouterr().out
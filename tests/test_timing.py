@@ -0,0 +1,78 @@
+import json
+import os
+import plac
+import pstats
+import pytest
+import sys
+
+try:
+    thisdir = os.path.dirname(os.path.abspath(__file__))
+    sys.path.append(os.path.join(thisdir, '..'))
+except:
+    sys.path.append('..')
+
+from urial import timing
+from urial.__main__ import main
+from urial.backends import MemoryStore
+from urial.scanner import uris_in_text, iter_uris
+
+
+def test_phase_timer():
+    timer = timing.PhaseTimer(start = 10)
+    timer.mark('one', 10.5)
+    timer.mark('two', 11)
+    timer.mark('one', 12)
+    assert timer.as_dict() == {'one': 1500, 'two': 500, 'total': 2000}
+
+
+def test_scanner_counts():
+    assert timing.counters is None
+    uris_in_text('no uris here: a://b')
+    timing.start_counting()
+    try:
+        uris_in_text('see a://b, c://d and e: f')
+        next(iter_uris('x://y z://w'))
+    finally:
+        counted = timing.stop_counting()
+    assert counted['texts_scanned'] == 2
+    assert counted['chunks_examined'] == 4
+    assert counted['uris_found'] == 3
+    assert counted['scan_seconds'] > 0
+
+
+def test_instrumented_store():
+    timing.start_counting()
+    try:
+        store = timing.InstrumentedStore(MemoryStore())
+        store.write('/x', 'a://b')
+        assert store.read('/x') == 'a://b'
+        assert store.read('/y') == ''
+        store.close()
+    finally:
+        counted = timing.stop_counting()
+    assert counted['comments_read'] == 2
+    assert counted['comments_written'] == 1
+    record = timing.metrics_record(timing.PhaseTimer(), counted, backend = 'memory')
+    assert set(record['io_ms']) == {'read', 'write'}
+    assert record['counters'] == {'comments_read': 2, 'comments_written': 1}
+    assert record['backend'] == 'memory'
+
+
+def test_metrics_and_profile_options(tmp_path):
+    file = tmp_path / 'file.txt'
+    file.write_text('')
+    comments = tmp_path / 'comments.json'
+    comments.write_text(json.dumps({str(file): 'x a://b'}))
+    metrics = tmp_path / 'metrics.jsonl'
+    profile = tmp_path / 'urial.prof'
+    for _ in range(2):
+        with pytest.raises(SystemExit) as exit:
+            plac.call(main, ['-U', '-B', f'json:{comments}', '-j', str(metrics),
+                             '-f', str(profile), 'a://b', str(file)])
+        assert exit.value.code == 0
+    records = [json.loads(line) for line in metrics.read_text().splitlines()]
+    assert len(records) == 2
+    assert set(records[0]['phases_ms']) == {'import', 'parse', 'setup', 'io', 'total'}
+    assert records[0]['counters'] == {'comments_read': 1, 'writes_skipped': 1}
+    assert timing.counters is None
+    assert pstats.Stats(str(profile)).total_calls > 0
@@ -0,0 +1,76 @@
+import os
+import pytest
+import sys
+import threading
+import time
+
+try:
+    thisdir = os.path.dirname(os.path.abspath(__file__))
+    sys.path.append(os.path.join(thisdir, '..'))
+except:
+    sys.path.append('..')
+
+from urial.backends import MemoryStore
+from urial.tree import files_in, comments_of
+
+
+class SlowStore(MemoryStore):
+    '''Memory store that takes a while to read, and counts parallel reads.'''
+
+    def __init__(self, comments = None):
+        super().__init__(comments)
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def read(self, file):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(0.01)
+        with self.lock:
+            self.active -= 1
+        if file.endswith('bad'):
+            raise OSError('cannot read')
+        return super().read(file)
+
+
+@pytest.fixture
+def tree(tmp_path):
+    for path in ['a.md', 'b.pdf', 'sub/c.md', 'sub/deeper/d.md', 'skip/e.md']:
+        (tmp_path / path).parent.mkdir(parents = True, exist_ok = True)
+        (tmp_path / path).write_text('')
+    return tmp_path
+
+
+def test_files_in(tree):
+    def relative(paths):
+        return sorted(os.path.relpath(path, tree) for path in paths)
+    assert relative(files_in(str(tree))) \
+        == ['a.md', 'b.pdf', 'skip/e.md', 'sub/c.md', 'sub/deeper/d.md']
+    assert relative(files_in(str(tree), include = ['*.md'], exclude = ['skip'])) \
+        == ['a.md', 'sub/c.md', 'sub/deeper/d.md']
+    assert relative(files_in(str(tree), exclude = ['sub/deeper', '*.pdf'])) \
+        == ['a.md', 'skip/e.md', 'sub/c.md']
+    assert list(files_in(str(tree / 'a.md'))) == [str(tree / 'a.md')]
+
+
+def test_comments_of():
+    store = SlowStore({f'/f{i}': f'x://{i}' for i in range(50)})
+    files = [f'/f{i}' for i in range(50)] + ['/bad']
+    results = list(comments_of(store, files, workers = 5))
+    assert sorted((f, c) for f, c, e in results if not e) \
+        == sorted((f'/f{i}', f'x://{i}') for i in range(50))
+    assert [f for f, c, e in results if e] == ['/bad']
+    assert 1 < store.max_active <= 5
+
+
+def test_comments_of_is_lazy():
+    consumed = []
+    def files():
+        for i in range(1000):
+            consumed.append(i)
+            yield f'/f{i}'
+    results = comments_of(SlowStore(), files(), workers = 2)
+    next(results)
+    assert len(consumed) <= 10
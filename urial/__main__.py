@@ -14,17 +14,19 @@
           + str(sys.version_info.major) + '.' + str(sys.version_info.minor) + '.')
     exit(1)
 
-# Note: this code uses lazy loading.  Additional imports are made below.
-import plac
-from   sidetrack import set_debug, log
-from   uritools import urisplit
+# Note: this code uses lazy loading.  Additional imports are made below, in
+# the code paths that need them, so that (e.g.) --version and argument errors
+# don't pay for loading the URI scanner, the comment backends, and so on.
+from   time import perf_counter
+_STARTED = perf_counter()
 
-
-# Constants.
-# .............................................................................
+# The plac package's __init__ also loads plac_ext and plac_tk, which import
+# (among other things) multiprocessing and tkinter and take longer to load
+# than all the rest of urial. Everything we use is in plac_core.
+import plac_core as plac                  # noqa: E402
+from   sidetrack import set_debug, log      # noqa: E402
 
-_NON_URI_CHARS = r'"\<>^`{}|'
-_NON_URI_END = tuple(r".,:;'?!$([")
+_IMPORTED = perf_counter()
 
 
 # Main body.
@@ -33,14 +35,37 @@
 @plac.annotations(
     mode    = ('how to handle existing comment (see help for info)'   , 'option', 'm'),
     print_  = ('print the Finder comment or the URI, and exit'        , 'option', 'p'),
+    recurse = ('with --print, read all files in directories given'    , 'flag'  , 'r'),
+    scan    = ('print the URIs in the text of the files given, & exit', 'flag'  , 'c'),
+    scheme  = ('with --print uri or --scan, only print "E" URIs'      , 'option', 'e'),
+    cache   = ('keep results of URI scans in cache file "C"'          , 'option', 'k'),
+    include = ('with --recurse, only read files matching glob(s) "I"' , 'option', 'i'),
+    exclude = ('with --recurse, skip files/dirs matching glob(s) "X"' , 'option', 'x'),
+    workers = ('with --recurse, read up to "W" comments at once'      , 'option', 'w'),
+    index   = ('update URI index in database "N" for dirs given'      , 'option', 'n'),
+    lookup  = ('with --index, print files having the URIs given'     , 'flag'  , 'l'),
+    batch   = ('read URI & file pairs from file "B" ("-" is stdin)'   , 'option', 'b'),
+    migrate = ('replace URIs using old/new pairs in file "MAP"'       , 'option', 'g'),
+    plan    = ('save planned changes in file "PLAN" without writing'  , 'option', 'P'),
+    apply   = ('make the changes in plan file "PLAN" (see help)'      , 'option', 'A'),
+    undo    = ('with --apply, roll back the changes made by the plan' , 'flag'  , 'u'),
+    backend = ('how to access comments (default: finder)'             , 'option', 'B'),
+    serve   = ('run as a server listening on socket "S" (see help)'   , 'option', 'S'),
+    timing  = ('report how long each phase of the run took'           , 'flag'  , 'T'),
+    metrics = ('append timings & counts as JSON to file "FILE"'       , 'option', 'j'),
+    profile = ('write Python profiler data to file "FILE"'            , 'option', 'f'),
     strict  = ('be strict about recognizing URIs (see help for info)' , 'flag'  , 's'),
     no_gui  = ('do not use macOS GUI dialogs for error messages'      , 'flag'  , 'U'),
     version = ('print program version info and exit'                  , 'flag'  , 'V'),
     debug   = ('log debug output to "OUT" ("-" is console)'           , 'option', '@'),
-    args    = 'a URI followed by a file name',
+    args    = 'one or more URIs followed by a file name',
 )
-def main(mode = 'M', print_ = 'P', strict = False, no_gui = False,
-         version = False, debug = 'OUT', *args):
+def main(mode = 'M', print_ = 'P', recurse = False, scan = False, scheme = 'E',
+         cache = 'C', include = 'I', exclude = 'X', workers = '8', index = 'N',
+         lookup = False, batch = 'B', migrate = 'MAP', plan = 'PLAN', apply = 'PLAN',
+         undo = False, backend = 'finder', serve = 'S', strict = False, timing = False,
+         metrics = 'FILE', profile = 'FILE', no_gui = False, version = False,
+         debug = 'OUT', *args):
     '''Add or update a URI in a Finder comment.
 
 This program expects to be given one or more arguments on the command line, as
@@ -73,6 +98,13 @@ def main(mode = 'M', print_ = 'P', strict = False, no_gui = False,
 the same kind as the one given on the command line, then the Finder comment is
 not changed unless a suitable value for the option --mode is given (see below).
 
+More than one URI can be given before the file path. All of the URIs are then
+added to the comment in a single step (reading and writing the comment only
+once), each one according to the rules above. This is useful for keeping
+several URIs of different kinds up to date in the same comment; e.g.,
+
+  urial x-devonthink-item://8A1A0F18-068680226F3 https://example.org/x somefile.md
+
 URI detection
 ~~~~~~~~~~~~~
 
@@ -172,7 +204,190 @@ def main(mode = 'M', print_ = 'P', strict = False, no_gui = False,
   urial --print uri somefile.md
 
 If more than one URI is found in the Finder comment, they will be printed
-separately to the terminal, one per line.
+separately to the terminal, one per line. To print only the URIs that have a
+particular scheme, give the scheme name (without the colon) to the option
+--scheme; e.g., "--scheme x-devonthink-item". Schemes are compared without
+regard to case. This is also faster, because only the parts of a comment
+around occurrences of the scheme name need to be examined. The option
+--scheme can also be used with --recurse and --scan (described below).
+
+Printing the comments of many files
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+If the --recurse option is given together with --print, the arguments can be
+any number of files and directories; urial will read the comments of all the
+files in the directories and their subdirectories. For example,
+
+  urial --print uri --recurse ~/Documents/papers
+
+Each result is printed on a separate line as the file path, a tab character,
+and then either one URI (with --print uri; a file whose comment contains more
+than one URI produces more than one line) or the whole comment encoded as a
+JSON string (with --print comment). Files without URIs or comments produce no
+output. Results are printed as soon as they are available, which means they
+may not be in alphabetical order.
+
+The options --include and --exclude can be used to give glob patterns (such as
+"*.pdf"); multiple patterns can be separated by commas. Only files that match
+one of the --include patterns are read, and files and directories that match
+one of the --exclude patterns are skipped. Patterns containing "/" are matched
+against the path relative to the directory given on the command line; other
+patterns are matched against file and directory names.
+
+Because reading comments mostly involves waiting for Finder or the file
+system, urial reads the comments of several files at the same time. The
+option --workers sets the maximum number of reads in progress at once (the
+default is 8); larger values may help on network volumes.
+
+Finding URIs in text files
+~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+The URI detection rules described above are also useful for finding URIs in
+text files, such as logs and exports. If given the option --scan, urial will
+print the URIs found in the contents (not the comments) of the files given on
+the command line, one per line, using the same rules as for comments (and
+honoring --strict). The value "-" means to read the standard input. If more
+than one file is given, each line of output consists of the file path, a tab
+character, and a URI. Files are read in blocks, so files of any size can be
+scanned using a small, fixed amount of memory. Files are assumed to be
+encoded in UTF-8. For example,
+
+  urial --scan server.log
+
+Indexing URIs
+~~~~~~~~~~~~~
+
+To find which file has a given URI in its comment, urial would have to read
+the comments of every file. Instead, urial can maintain an index of the URIs
+found in the comments of files in an SQLite database, using the option
+--index with the path of the database file, followed by the files and
+directories to be indexed:
+
+  urial --index ~/uris.db ~/Documents/papers
+
+The first time, this will read the comments of all the files (the options
+--include, --exclude and --workers described above can be used here too).
+Afterwards, running the same command again will only read the comments of
+files that are new or have changed (judging by their inode number, size, and
+modification & status change times), and remove files that no longer exist.
+To look up files in the index, add the option --lookup and give one or more
+URIs instead of directories:
+
+  urial --index ~/uris.db --lookup x-devonthink-item://8A1A0F18-068680226F3
+
+This prints the path of every file whose comment contained the URI at the
+time of the last update of the index. If more than one URI is given, each
+line of output consists of a URI, a tab character, and a file path.
+
+Batch mode
+~~~~~~~~~~
+
+Starting Python and connecting to Finder takes far longer than updating a
+single comment. To process many files in one run, use the --batch option
+with the path of a file (or "-" to read from the standard input) containing
+one item per line. Each line can be either a URI and a file path separated by
+a tab character, or a JSON object with "uri" and "file" keys (where the value
+of "uri" can also be a list of URIs). For example,
+
+  urial --batch pairs.tsv
+
+will apply the same --mode rules as above to every pair in "pairs.tsv". When
+--print is also given, each line only needs to contain a file path (or a JSON
+object with a "file" key). In batch mode, urial reports one line of JSON per
+item on the standard output, describing what was done (or what went wrong)
+for that item. Errors on individual items do not stop the batch, but cause
+urial to exit with a nonzero status at the end.
+
+Migrating URIs
+~~~~~~~~~~~~~~
+
+When the URIs of many items change at once (for example, because a
+DEVONthink database was rebuilt), the option --migrate can be used to update
+the comments of all the files that refer to them. The value of --migrate is
+the path of a file containing one old URI and its new URI per line, separated
+by a tab character (or given as a JSON object with "old" and "new" keys). An
+old URI ending with "*" is a prefix: every URI that begins with it is changed
+by replacing that part with the new URI (minus any trailing "*"). The other
+arguments are files and directories; as with --recurse, directories are
+searched recursively, and the options --include, --exclude and --workers can
+be used. Every URI found in a comment that appears in the mapping file is
+replaced, regardless of --mode. For example,
+
+  urial --migrate new-uuids.tsv ~/Documents
+
+This can be combined with --plan (described below) to save the changes to a
+plan file instead of making them.
+
+Planning and applying changes
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+When updating many files, it can be useful to see what would be changed
+before changing anything, and to be able to undo the changes afterwards. If
+given the option --plan with a file path, urial will read the current
+comments of the files (given either on the command line or using --batch),
+work out what the new comments would be, and save the results in the given
+file as JSON lines, without writing any comments. Files whose comments would
+not change are left out of the plan. The changes can then be made using the
+option --apply with the same file path:
+
+  urial --batch pairs.tsv --plan changes.jsonl
+  urial --apply changes.jsonl
+
+While applying a plan, urial records what it is doing in a journal file (the
+plan file name with ".journal" appended). If urial is interrupted, running
+the same --apply command again will resume where it left off. Files whose
+comments have changed since the plan was made are not written. Files whose
+comments can't be read or written are reported, and the rest of the plan is
+still applied; running --apply again will retry them. Finally, the
+option --undo together with --apply will roll back the changes: it restores
+the previous comments of the files changed by the plan, using the journal
+file, and then deletes the journal file.
+
+Comment storage backends
+~~~~~~~~~~~~~~~~~~~~~~~~
+
+By default, urial reads and writes comments by sending Apple Events to the
+macOS Finder. The option --backend can be used to select a different way of
+accessing comments:
+
+  finder:    (default) ask Finder to get and set the comments
+
+  finder:N:  like finder, but when reading or writing the comments of many
+             files (with --batch, --apply, or options that read the files in
+             folders), handle up to N files in the same folder per Apple Event.
+             Comments can only be set this way for files that are given the
+             same comment; other files are still handled one at a time.
+
+  xattr:     read and write the extended attribute in which macOS stores the
+             Spotlight copy of the Finder comment. This is much faster than
+             using Finder, but Finder may not display changes made this way
+             (Finder keeps its own copy in .DS_Store files). On Linux, the
+             attribute is stored in the "user." namespace.
+
+  json:FILE: keep comments in the JSON file FILE, indexed by the absolute
+             paths of the files. This is mainly useful for testing.
+
+Server mode
+~~~~~~~~~~~
+
+Programs that need to run urial very often (e.g., a script run every time a
+file is added to a database) can avoid the cost of starting urial each time
+by starting a long-running server once, using the --serve option:
+
+  urial --serve /path/to/socket &
+
+The value of --serve is the path of a Unix domain socket on which to listen;
+the value "-" means to use a default path in the temporary directory (or the
+value of the environment variable URIAL_SOCKET, if set). The server keeps the
+comment backend (see --backend above) open between requests, and runs until
+it is killed or interrupted. Requests can then be sent using the program
+urial-client, which takes the same --mode, --print and --strict options and
+arguments as urial, plus the option --socket to give the socket path:
+
+  urial-client x-devonthink-item://8A1A0F18-068680226F3 somefile.md
+
+Other programs can also talk to the server directly: the protocol is one JSON
+object per line, with the keys "mode", "print", "strict", "uri" and "file".
 
 Additional command-line arguments
 ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
@@ -188,6 +403,30 @@ def main(mode = 'M', print_ = 'P', strict = False, no_gui = False,
 what it is doing. The trace will be sent to the given destination, which can
 be '-' to indicate console output, or a file path to send the output to a file.
 
+Comments written from templates often contain the same text over and over.
+Given the option --cache with a file path, urial will remember the results
+of examining each distinct piece of text for URIs, so that the work is not
+repeated, and will save them in the given file at the end of the run (or
+when the server started by --serve stops) for use in later runs. The cache
+holds up to 100,000 entries, discarding the least recently used ones when it
+is full.
+
+If given the --timing option, this program will print on the standard error
+output how long it took to load its modules ("import"), to parse the command
+line ("parse"), to set up the comment backend ("setup"), and to read, scan
+and write comments ("io"). The time taken to start Python itself is not
+included.
+
+For more detailed measurements, the option --metrics can be given the path
+of a file (or "-" for the standard error output). At the end of the run,
+urial will append to it one line of JSON containing the times above, the
+total time spent reading, scanning and writing comments, and counts of the
+comments read and written, the writes skipped because nothing changed, the
+texts scanned, the chunks of text examined for URIs, and the URIs found.
+Finally, the option --profile will make urial run under the Python profiler
+and write the results to the given file, which can be examined with the
+Python "pstats" module.
+
 Command-line arguments summary
 ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 '''
@@ -198,9 +437,49 @@ def stop(msg): inform(msg, no_gui), sys.exit(1)   # noqa: #704
 
     # Process arguments & handle early exits ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
 
+    if timing or metrics != 'FILE':
+        from urial.timing import PhaseTimer, start_counting
+        timer = PhaseTimer(_STARTED)
+        timer.mark('import', _IMPORTED)
+        timer.mark('parse')
+        if metrics != 'FILE':
+            start_counting()
+
+    if profile != 'FILE':
+        from cProfile import Profile
+        profiler = Profile()
+        profiler.enable()
+
+    def finish():
+        # Save the cache, and print or save the timing, counts and profiling
+        # data requested.
+        if cache != 'C':
+            from urial.scanner import get_cache
+            get_cache().save(cache)
+        if timing or metrics != 'FILE':
+            timer.mark('io')
+        if timing:
+            print('urial timing: ' + timer.summary(), file = sys.stderr)
+        if metrics != 'FILE':
+            from json import dumps
+            from urial.timing import metrics_record, stop_counting
+            extra = {'cache': get_cache().stats()} if cache != 'C' else {}
+            record = dumps(metrics_record(timer, stop_counting(), backend = backend,
+                                          **extra))
+            if metrics == '-':
+                print(record, file = sys.stderr)
+            else:
+                with open(metrics, 'a', encoding = 'utf-8') as f:
+                    f.write(record + '\n')
+        if profile != 'FILE':
+            profiler.disable()
+            profiler.dump_stats(profile)
+
     if debug != 'OUT':
         set_debug(True, debug)
 
+    from os.path import exists
+
     if version:
         from urial import print_version
         print_version()
@@ -211,68 +490,262 @@ def stop(msg): inform(msg, no_gui), sys.exit(1)   # noqa: #704
         stop(f'Unrecognized mode value: {mode}')
 
     show = print_.lower() if print_ != 'P' else False
-    if show:
-        if show not in ['comment', 'uri']:
-            stop(f'Invalid option value for --print: {print_}. The valid'
-                 ' options are "comment" and "uri".')
+    if show and show not in ['comment', 'uri']:
+        stop(f'Invalid option value for --print: {print_}. The valid'
+             ' options are "comment" and "uri".')
+
+    scheme = None if scheme == 'E' else scheme.rstrip(':')
+    if scheme is not None and not (scan or show == 'uri'):
+        stop('Option --scheme can only be used with --scan or --print uri.')
+
+    if cache != 'C':
+        from urial.cache import ChunkCache
+        from urial.scanner import set_cache
+        try:
+            set_cache(ChunkCache.load(cache))
+        except (OSError, ValueError, TypeError) as ex:
+            stop(f'Unable to read cache file {cache}: {ex}')
+
+    if scan:
+        others = [batch != 'B', show, recurse, index != 'N', lookup, migrate != 'MAP',
+                  plan != 'PLAN', apply != 'PLAN', undo, serve != 'S']
+        if not args or any(others):
+            stop('Option --scan must be given one or more file paths (or "-" for'
+                 ' the standard input) and cannot be combined with other actions.')
+        if missing := [path for path in args if path != '-' and not exists(path)]:
+            stop(f'File does not appear to exist: {missing[0]}')
+        from urial.stream import scan_file
+        failures = 0
+        for path in args:
+            try:
+                for uri in scan_file(path, strict, scheme = scheme):
+                    print(uri if len(args) == 1 else path + '\t' + uri)
+            except OSError as ex:
+                log(f'error reading {path}: {ex}')
+                print(f'‼️  {path}: {ex}', file = sys.stderr)
+                failures += 1
+        finish()
+        sys.exit(1 if failures else 0)
+
+    if serve != 'S':
+        if args or batch != 'B':
+            stop('Option --serve cannot be combined with --batch or arguments.')
+        from urial.client import default_socket_path
+        from urial.server import serve as run_server
+        import signal
+        socket_path = default_socket_path() if serve == '-' else serve
+        # Exit through the normal route so that the socket file is removed.
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+        try:
+            run_server(socket_path, backend)
+        except KeyboardInterrupt:
+            log('user interrupted program -- exiting')
+        except Exception as ex:             # noqa: PIE786
+            stop('Encountered error: ' + str(ex))
+        finally:
+            finish()
+        sys.exit(0)
+
+    if apply != 'PLAN':
+        others = [batch != 'B', show, recurse, scan, index != 'N', lookup,
+                  migrate != 'MAP', plan != 'PLAN']
+        if args or any(others):
+            stop('Option --apply cannot be combined with other actions or arguments.')
+        if not exists(apply):
+            stop(f'Plan file does not appear to exist: {apply}')
+    elif undo:
+        stop('Option --undo can only be used together with --apply.')
+    elif plan != 'PLAN' and (show or recurse or index != 'N'):
+        stop('Option --plan cannot be combined with --print or --index.')
+    elif migrate != 'MAP':
+        if not args or batch != 'B' or index != 'N' or show:
+            stop('Option --migrate must be given one or more file or directory'
+                 ' arguments and cannot be combined with --batch, --index or'
+                 ' --print.')
+        if not exists(migrate):
+            stop(f'Mapping file does not appear to exist: {migrate}')
+        if missing := [path for path in args if not exists(path)]:
+            stop(f'File or directory does not appear to exist: {missing[0]}')
+        if not workers.isdigit() or int(workers) < 1:
+            stop(f'Invalid value for --workers: {workers}')
+    elif index != 'N':
+        if not args or batch != 'B' or show:
+            stop('Option --index must be given one or more file or directory'
+                 ' arguments (or URIs, with --lookup) and cannot be combined'
+                 ' with --batch or --print.')
+        if lookup and not exists(index):
+            stop(f'Index database does not appear to exist: {index}')
+        if not lookup and (missing := [path for path in args if not exists(path)]):
+            stop(f'File or directory does not appear to exist: {missing[0]}')
+        if not workers.isdigit() or int(workers) < 1:
+            stop(f'Invalid value for --workers: {workers}')
+    elif lookup:
+        stop('Option --lookup can only be used together with --index.')
+    elif recurse:
+        if not show:
+            stop('Option --recurse can only be used together with --print.')
+        if not args or batch != 'B':
+            stop('Option --recurse must be given one or more file or directory'
+                 ' arguments and cannot be combined with --batch.')
+        if not workers.isdigit() or int(workers) < 1:
+            stop(f'Invalid value for --workers: {workers}')
+        if missing := [path for path in args if not exists(path)]:
+            stop(f'File or directory does not appear to exist: {missing[0]}')
+    elif batch != 'B':
+        if args:
+            stop('Option --batch cannot be combined with a URI or file argument.')
+        if batch != '-' and not exists(batch):
+            stop(f'Batch file does not appear to exist: {batch}')
+    elif show:
+        if not args:
+            stop('Must be given a file path.')
+        uri = None
         file = args[0]
     else:
         if len(args) < 2:
             stop('Must be given at least two arguments: a URI and a file path.')
-        uri = args[0]
-        file = args[1]
-        scheme = urisplit(uri).scheme
-        if not scheme:
-            stop(f'Could not interpret argument value "{uri}" as a URI.')
-
-    if file == '':
-        stop('File name must not be an empty string.')
-    from os.path import exists
-    if not exists(file):
-        stop(f'File does not appear to exist: {file}')
+        from uritools import urisplit
+        uri = args[0] if len(args) == 2 else list(args[:-1])
+        file = args[-1]
+        for value in args[:-1]:
+            if not urisplit(value).scheme:
+                stop(f'Could not interpret argument value "{value}" as a URI.')
+
+    if (batch == 'B' and not recurse and index == 'N' and apply == 'PLAN'
+            and migrate == 'MAP'):
+        if file == '':
+            stop('File name must not be an empty string.')
+        if not exists(file):
+            stop(f'File does not appear to exist: {file}')
 
     # Do the real work --------------------------------------------------------
 
-    import appscript
-    import mactypes
+    if index != 'N' and lookup:
+        from urial.index import URIIndex
+        with URIIndex(index) as uri_index:
+            for uri in args:
+                for path in uri_index.files_with(uri):
+                    print(f'{uri}\t{path}' if len(args) > 1 else path)
+        finish()
+        sys.exit(0)
+
+    from urial.backends import comment_store
+    failures = 0
     try:
-        log(f'urial is running in {mode} mode')
-        log('telling Finder to open file ' + file)
-        finder = appscript.app('Finder')
-        finder_file = finder.items[mactypes.Alias(file)]
-        comment = finder_file.comment()
-        if show:
+        log(f'urial is running in {mode} mode using backend {backend}')
+        store = comment_store(backend)
+        if timing or metrics != 'FILE':
+            timer.mark('setup')
+        if metrics != 'FILE':
+            from urial.timing import InstrumentedStore
+            store = InstrumentedStore(store)
+        if apply != 'PLAN':
+            from urial.plan import apply_plan, rollback_plan
+            if undo:
+                stats = rollback_plan(store, apply)
+                print(f'Restored {stats["restored"]} comments;'
+                      f' {stats["conflicts"]} had changed since and were left alone'
+                      f' and {stats["failed"]} could not be restored.')
+            else:
+                stats = apply_plan(store, apply)
+                print(f'Wrote {stats["written"]} comments;'
+                      f' {stats["skipped"]} were already done,'
+                      f' {stats["conflicts"]} had changed since the plan was made'
+                      f' and {stats["failed"]} could not be read or written.')
+            failures = stats['conflicts'] + stats['failed']
+        elif migrate != 'MAP':
+            from os.path import abspath
+            from urial.migrate import URIMapping, migrations
+            mapping = URIMapping.from_file(migrate)
+            globs = {'include': include != 'I' and include.split(','),
+                     'exclude': exclude != 'X' and exclude.split(',')}
+            changes = []
+            writes = []
+            count = 0
+
+            def write_pending():
+                nonlocal count, failures
+                errors = store.write_many([(file, new) for file, new, _ in writes])
+                for (file, _, uris), error in zip(writes, errors):
+                    if error:
+                        log(f'error writing comment of {file}: {error}')
+                        print(f'‼️  {file}: {error}', file = sys.stderr)
+                        failures += 1
+                    else:
+                        count += len(uris)
+                        changes.append(file)
+                writes.clear()
+
+            for file, old, new, uris, error in migrations(store, args, mapping, strict,
+                                                          int(workers), **globs):
+                if error:
+                    log(f'error reading comment of {file}: {error}')
+                    print(f'‼️  {file}: {error}', file = sys.stderr)
+                    failures += 1
+                elif plan != 'PLAN':
+                    count += len(uris)
+                    # Plans refer to files by absolute paths (see make_plan()).
+                    changes.append({'file': abspath(file),
+                                    'uris': [new for _, new in uris],
+                                    'actions': ['migrated'] * len(uris),
+                                    'old': old, 'new': new})
+                else:
+                    log(f'migrating {len(uris)} URIs in comment of {file}')
+                    writes.append((file, new, uris))
+                    if len(writes) >= store.batch_size:
+                        write_pending()
+            if writes:
+                write_pending()
+            if plan != 'PLAN':
+                from urial.plan import write_plan
+                write_plan(changes, plan)
+                print(f'Planned changes to {count} URIs in {len(changes)} files'
+                      f' and saved them in {plan}.')
+            else:
+                print(f'Migrated {count} URIs in {len(changes)} files.')
+        elif plan != 'PLAN':
+            from urial.plan import make_plan, write_plan
+            items = batch_items(batch) if batch != 'B' else [(uri, file)]
+            changes, errors = make_plan(store, items, mode, strict)
+            for file, error in errors:
+                print(f'‼️  {file}: {error}', file = sys.stderr)
+            write_plan(changes, plan)
+            print(f'Planned changes to {len(changes)} files and saved them in {plan}.')
+            failures = len(errors)
+        elif index != 'N':
+            from urial.index import URIIndex
+            globs = {'include': include != 'I' and include.split(','),
+                     'exclude': exclude != 'X' and exclude.split(',')}
+            with URIIndex(index) as uri_index:
+                stats = uri_index.refresh(store, args, strict, int(workers), **globs)
+            log(f'index refresh results: {stats}')
+            print(f'Indexed {stats["read"] + stats["unchanged"]} files:'
+                  f' {stats["read"]} read, {stats["unchanged"]} unchanged,'
+                  f' {stats["removed"]} removed, {stats["failed"]} failed.')
+            failures = stats['failed']
+        elif recurse:
+            globs = {'include': include != 'I' and include.split(','),
+                     'exclude': exclude != 'X' and exclude.split(',')}
+            failures = print_tree(store, args, show, strict, int(workers),
+                                  scheme = scheme, **globs)
+        elif batch == 'B':
+            from urial.comments import processed
+            result = processed(store, file, uri, mode, show, strict, scheme)
             if show == 'comment':
-                print(comment)
-            elif (uris := uris_in_text(comment, strict)):
-                print('\n'.join(uris))
-        elif not comment:
-            log('file has no comment, so writing ' + uri)
-            finder_file.comment.set(uri)
-        elif mode == 'overwrite':
-            # There's a comment, but overwrite mode is in effect.
-            log('overwriting existing Finder comment with ' + uri)
-            finder_file.comment.set(uri)
-        elif uri in comment:
-            log('comment already contains the same URI: ' + uri)
-        elif mode == 'append':
-            log('appending to existing Finder comment the string ' + uri)
-            finder_file.comment.set(comment + '\n' + uri)
-        elif mode == 'prepend':
-            log('prepending to existing Finder comment the string ' + uri)
-            finder_file.comment.set(uri + '\n' + comment)
+                print(result['comment'])
+            elif show and result['uris']:
+                print('\n'.join(result['uris']))
         else:
-            # Check if there's a URI with the same scheme in the comment.
-            uris = uris_in_text(comment, strict)
-            same_scheme_uris = [u for u in uris if urisplit(u).scheme == scheme]
-            if any(same_scheme_uris):
-                log(f'replacing {same_scheme_uris[0]} with {uri}')
-                parts = comment.partition(same_scheme_uris[0])
-                new_comment = parts[0] + uri + parts[2]
-                finder_file.comment.set(new_comment)
-            else:
-                # Didn't find a URI of the same kind and we're not appending.
-                log('nothing to do')
+            from json import dumps
+            from urial.comments import processed_many
+            for items in batch_groups(batch_items(batch, show), store.batch_size):
+                results = processed_many(store, items, mode, show, strict, scheme)
+                for (_, file), result in zip(items, results):
+                    if 'error' in result:
+                        log(f'error processing {file}: {result["error"]}')
+                        failures += 1
+                    print(dumps({'file': file, **result}), flush = True)
+        store.close()
     except KeyboardInterrupt:
         log('user interrupted program -- exiting')
         sys.exit(0)
@@ -284,69 +757,112 @@ def stop(msg): inform(msg, no_gui), sys.exit(1)   # noqa: #704
 
     # If we get here, exit normally -------------------------------------------
 
+    finish()
     log('done.')
-    sys.exit(0)
+    sys.exit(1 if failures else 0)
 
 
-# Miscellaneous helpers.
+# Helpers for processing many files.
 # .............................................................................
-# The syntax of URIs is defined in https://www.rfc-editor.org/rfc/rfc3986.
-
-def unsurrounded(text):
-    '''Remove matched parentheses or brackets surrounding the text.'''
-    # Loop in order to handle nested cases.
-    while text.startswith(('(', '[')):
-        if text.startswith('(') and text.endswith(')'):
-            text = text[1:-1]
-        elif text.startswith('[') and text.endswith(']'):
-            text = text[1:-1]
+
+def print_tree(store, roots, show, strict, workers, include = None, exclude = None,
+               scheme = None):
+    '''Print the comments or URIs of the files under the given roots.
+
+    Returns the number of files whose comments could not be read.
+    '''
+    from itertools import chain
+    from json import dumps
+    from urial.scanner import uris_in_text
+    from urial.tree import files_in, comments_of
+    files = chain.from_iterable(files_in(root, include, exclude) for root in roots)
+    failures = 0
+    for file, comment, error in comments_of(store, files, workers):
+        if error:
+            log(f'error reading comment of {file}: {error}')
+            print(f'‼️  {file}: {error}', file = sys.stderr)
+            failures += 1
+        elif not comment:
+            continue
+        elif show == 'comment':
+            print(file + '\t' + dumps(comment, ensure_ascii = False))
         else:
-            break
-    return text
-
-
-def extracted_uri(text, strict = False):
-    # URIs have to begin with a scheme description, which means any character
-    # not allowed in a scheme description can't be part of the start of a URI.
-    # Further, scheme descriptions have to start with an alpha character, so
-    # any other character at the start can be stripped away.  Making this
-    # trickier is that chunks may have URIs nested inside parens or brackets,
-    # so we can't blindly just strip chars from the front and back.
-    while text and (not text[0].isalpha()
-                    or (not strict and text.endswith(_NON_URI_END + (')', ']')))):
-        text = unsurrounded(text)
-        if not text:
-            break
-        elif not text[0].isalpha():
-            text = text[1:]
-        elif text.endswith((')', ']')) and '(' not in text and '[' not in text:
-            text = text[:-1]
-        elif not strict and text.endswith(_NON_URI_END):
-            text = text[:-1]
+            for uri in uris_in_text(comment, strict, scheme = scheme):
+                print(file + '\t' + uri)
+    return failures
+
+
+def batch_items(source, show = False):
+    '''Yield (uri, file) tuples read from the file named by source.
+
+    Each line of the source can be a URI and a file path separated by a tab
+    character, or a JSON object with "uri" and "file" keys. If show is true,
+    lines only need to contain a file path, and the uri yielded is None.
+    Blank lines and lines beginning with "#" are skipped. For a line that
+    can't be interpreted, the tuple yielded is (exception, ''), where the
+    exception describes the problem; item_problem() reports it as the error
+    for that item, so that the rest of the batch can still be processed.
+    '''
+    if source == '-':
+        yield from parsed_batch_lines(sys.stdin, show)
+    else:
+        with open(source, encoding = 'utf-8') as f:
+            yield from parsed_batch_lines(f, show)
+
+
+def batch_groups(items, size):
+    '''Yield lists of up to size items, such that no file occurs twice in one.
+
+    A group is yielded as soon as it is full, so that when size is 1, each
+    item is yielded without waiting for the next one to be read. Files are
+    compared by their absolute paths, so "f.txt" and "./f.txt" are the same.
+    '''
+    from os.path import abspath
+    group, files = [], set()
+    for uri, file in items:
+        path = abspath(file)
+        if path in files:
+            yield group
+            group, files = [], set()
+        group.append((uri, file))
+        files.add(path)
+        if len(group) >= size:
+            yield group
+            group, files = [], set()
+    if group:
+        yield group
+
+
+def parsed_batch_lines(lines, show):
+    from json import loads
+    for number, line in enumerate(lines, 1):
+        line = line.rstrip('\r\n')
+        if not line.strip() or line.startswith('#'):
+            continue
+        if line.lstrip().startswith('{'):
+            try:
+                item = loads(line)
+                if not isinstance(item, dict):
+                    raise ValueError('value is not a JSON object')
+                uri, file = item.get('uri'), item.get('file', '')
+                if not isinstance(file, str):
+                    raise TypeError('value of "file" is not a string')
+                if not (uri is None or isinstance(uri, (str, list))):
+                    raise TypeError('value of "uri" is not a string or a list')
+            except (ValueError, TypeError) as ex:
+                log(f'unable to interpret line {number} of batch input: {ex}')
+                yield ValueError(f'Unable to interpret line {number}: {ex}'), ''
+                continue
+            yield uri, file
+        elif show:
+            yield None, line
         else:
-            break
-    uri = urisplit(text)
-    if not uri.scheme:
-        return ''
-    if not strict and not any([uri.authority, uri.path, uri.query, uri.fragment]):
-        return ''
-    return text
-
-
-def uris_in_text(text, strict = False):
-    '''Try to find URIs in the given text and return urisplit objects.'''
-    # Do a first pass of this in case the whole text is surrounded.
-    text = unsurrounded(text)
-    # 1st replace non-URI special characters like < and > by a space, then
-    # use split(' ') to bust up the text into chunks.
-    import string
-    separators = string.whitespace + _NON_URI_CHARS
-    space_replacements = str.maketrans(separators, ' '*len(separators))
-    chunks = str.translate(text, space_replacements).split(' ')
-    # Now we have chunks that may be URIs or contain URIs embedded in them.
-    # Examine each chunk and return the URIs found.
-    return list(filter(None, [extracted_uri(chunk, strict) for chunk in chunks]))
+            uri, _, file = line.partition('\t')
+            yield uri, file
 
+
+# Miscellaneous helpers.
+# .............................................................................
 
 def inform(msg, no_gui):
     log('inform: ' + msg)
@@ -360,6 +876,20 @@ def inform(msg, no_gui):
         sa.display_dialog('𝗨𝗿𝗶𝗮𝗹 𝗲𝗿𝗿𝗼𝗿:\n\n' + msg, buttons = ["OK"],
                           default_button = 'OK', with_icon = 0)
 
+
+def __getattr__(name):
+    # The URI scanning functions used to be defined in this file. Continue to
+    # make them available from here, but without loading them unless needed.
+    if name in ['uris_in_text', 'iter_uris', 'extracted_uri', 'unsurrounded']:
+        from urial import scanner
+        return getattr(scanner, name)
+    # Likewise for the comment processing functions, now in comments.py.
+    if name in ['processed', 'processed_many', 'result_for', 'updated_comment',
+                'updated_comment_all', 'item_problem']:
+        from urial import comments
+        return getattr(comments, name)
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
 
 # Main entry point.
 # .............................................................................
@@ -0,0 +1,158 @@
+'''
+aio.py: asyncio interface for reading and updating comments
+
+Reading or writing a comment mostly consists of waiting for Finder (or the
+file system) to respond. Programs built on asyncio can use the AsyncComments
+class in this module to have many such operations in progress at once
+without blocking their event loop: each operation is run by a pool of
+threads, and a limit on the number of operations in progress at any time
+keeps Finder (or whatever the backend is) from being flooded with requests.
+
+Example of use:
+
+    from urial.aio import AsyncComments
+    from urial.backends import comment_store
+
+    async with AsyncComments(comment_store('finder'), limit = 16) as comments:
+        print(await comments.read_comment('somefile.md'))
+        async for result in comments.update_many(pairs):
+            print(result)
+
+Copyright 2024 Michael Hucka.
+
+Licensed under the MIT License – see file "LICENSE" in the project website.
+For more information, please visit https://github.com/mhucka/urial
+'''
+
+import asyncio
+from   concurrent.futures import ThreadPoolExecutor
+import os
+from   sidetrack import log
+
+from   urial.comments import processed
+
+
+# Class definitions.
+# .............................................................................
+
+class AsyncComments():
+    '''Asynchronous wrapper around a CommentStore object.
+
+    The value of store must be a CommentStore object (see backends.py), and
+    limit is the maximum number of operations on the store that can be in
+    progress at the same time. Calling close() (or leaving an "async with"
+    block) closes the store.
+    '''
+
+    def __init__(self, store, limit = 8):
+        if limit < 1:
+            raise ValueError(f'Invalid concurrency limit: {limit}')
+        self.store = store
+        self.limit = limit
+        self._executor = ThreadPoolExecutor(max_workers = limit,
+                                            initializer = store.prepare_thread)
+        # Created on first use, so that it belongs to the running event loop.
+        self._semaphore = None
+        # Locks for files being updated, with the number of tasks using each.
+        self._file_locks = {}
+
+
+    async def __aenter__(self):
+        return self
+
+
+    async def __aexit__(self, *_):
+        await self.close()
+
+
+    async def read_comment(self, file):
+        '''Return the comment of the given file.'''
+        return await self._run(self.store.read, file)
+
+
+    async def write_comment(self, file, comment):
+        '''Set the comment of the given file to the given string.'''
+        await self._run(self.store.write, file, comment)
+
+
+    async def update_uri(self, file, uri, mode = 'update', strict = False):
+        '''Add uri (or a list of URIs) to the comment of file.
+
+        The values of mode and strict have the same meanings as for the urial
+        command-line options. Returns a dict like those produced by urial in
+        batch mode, with the keys "uri" and "action". The comment is read and
+        written as a single operation, counting as one against the limit.
+        Updates of the same file are done one after the other, so that one
+        doesn't undo the effect of another.
+        '''
+        key = os.path.abspath(file)
+        entry = self._file_locks.setdefault(key, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                return await self._run(processed, self.store, file, uri, mode,
+                                       False, strict)
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._file_locks[key]
+
+
+    async def update_many(self, items, mode = 'update', strict = False):
+        '''Update the comments of many files, yielding results as they finish.
+
+        The value of items can be an iterable or an asynchronous iterable of
+        (uri, file) tuples, and is consumed lazily: no more than twice the
+        limit of items are taken from it before their results are consumed,
+        so that slow consumers and endless sources don't cause memory to grow.
+        Yields a dict for each item with the key "file" and either the keys
+        "uri" and "action" or the key "error", in the order the items finish.
+        Items for the same file are processed in the order they are given.
+        '''
+        pending = set()
+        async for uri, file in _aiter(items):
+            pending.add(asyncio.ensure_future(self._update(file, uri, mode, strict)))
+            if len(pending) >= 2 * self.limit:
+                done, pending = await asyncio.wait(pending,
+                                                   return_when = asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+        while pending:
+            done, pending = await asyncio.wait(pending,
+                                               return_when = asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+
+
+    async def close(self):
+        '''Wait for operations in progress to finish, and close the store.'''
+        await asyncio.get_running_loop().run_in_executor(None, self._executor.shutdown)
+        self.store.close()
+
+
+    async def _run(self, function, *args):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.limit)
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, function, *args)
+
+
+    async def _update(self, file, uri, mode, strict):
+        try:
+            return {'file': file, **await self.update_uri(file, uri, mode, strict)}
+        except Exception as ex:             # noqa: PIE786
+            log(f'error processing {file}: {ex}')
+            return {'file': file, 'error': str(ex)}
+
+
+# Miscellaneous helpers.
+# .............................................................................
+
+async def _aiter(items):
+    if hasattr(items, '__aiter__'):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
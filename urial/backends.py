@@ -0,0 +1,346 @@
+'''
+backends.py: objects for reading and writing file comments
+
+Urial normally reads and writes Finder comments by sending Apple Events to
+the macOS Finder. That is slow (one round trip per operation) and only works
+in a logged-in macOS session. The classes in this module put comment access
+behind a small interface so that other storage mechanisms can be used:
+
+  FinderStore: ask Finder via Apple Events (the default), optionally
+               getting or setting many comments per Apple Event
+  XattrStore:  read/write the extended attribute that holds the comment
+  MemoryStore: keep comments in a Python dict (useful for testing)
+  JSONStore:   keep comments in a JSON file (useful for testing)
+
+Use the function comment_store() to get an instance given a backend name.
+
+Copyright 2024 Michael Hucka.
+
+Licensed under the MIT License – see file "LICENSE" in the project website.
+For more information, please visit https://github.com/mhucka/urial
+'''
+
+import errno
+import os
+from   sidetrack import log
+import sys
+
+
+# Constants.
+# .............................................................................
+
+# Finder mirrors comments into this attribute, where Spotlight reads them.
+# On Linux, only attributes in the "user" namespace can be set by users.
+_XATTR_NAME = ('' if sys.platform == 'darwin' else 'user.') \
+    + 'com.apple.metadata:kMDItemFinderComment'
+
+# Error codes meaning "the file has no such extended attribute".
+_NO_ATTR_ERRNOS = {errno.ENODATA, getattr(errno, 'ENOATTR', errno.ENODATA)}
+
+BACKENDS = ['finder', 'finder:N', 'xattr', 'memory', 'json:FILE']
+
+
+# Class definitions.
+# .............................................................................
+
+class CommentStore():
+    '''Base class for objects that read and write the comments of files.
+
+    The attribute batch_size is the number of files that callers should give
+    read_many() and write_many() at a time; for most subclasses it is 1,
+    because they have no faster way of handling many files than one by one.
+    '''
+
+    batch_size = 1
+
+    def read(self, file):
+        '''Return the comment of the given file, or '' if it has none.'''
+        raise NotImplementedError
+
+
+    def write(self, file, comment):
+        '''Set the comment of the given file to the given string.'''
+        raise NotImplementedError
+
+
+    def read_many(self, files):
+        '''Return a list of (comment, error) tuples for the given files.
+
+        The value of error is None, or the exception raised while reading the
+        comment of the corresponding file (in which case comment is None).
+        '''
+        results = []
+        for file in files:
+            try:
+                results.append((self.read(file), None))
+            except Exception as ex:             # noqa: PIE786
+                results.append((None, ex))
+        return results
+
+
+    def write_many(self, pairs):
+        '''Write comments given as (file, comment) tuples.
+
+        Returns a list with an entry for each pair, which is None or the
+        exception raised while writing the comment of that file. The files
+        in the pairs must all be different.
+        '''
+        errors = []
+        for file, comment in pairs:
+            try:
+                self.write(file, comment)
+                errors.append(None)
+            except Exception as ex:             # noqa: PIE786
+                errors.append(ex)
+        return errors
+
+
+    def prepare_thread(self):
+        '''Get ready for use by the calling thread, one of a pool of threads.
+
+        Code that shares a store among a pool of threads calls this at the
+        start of each thread (e.g., as the initializer of a ThreadPoolExecutor).
+        '''
+
+
+    def flush(self):
+        '''Save any pending changes.'''
+
+
+    def close(self):
+        '''Save any pending changes and release any resources held.'''
+        self.flush()
+
+
+class FinderStore(CommentStore):
+    '''Read and write Finder comments by sending Apple Events to Finder.
+
+    An instance has one connection to Finder, which callers must not use from
+    more than one thread at a time. Threads of a pool that have called
+    prepare_thread() get their own connections instead, so that an instance
+    can be shared by a pool of threads reading comments concurrently.
+
+    If batch_size is greater than 1, read_many() and write_many() handle up
+    to that many files in the same folder with a single Apple Event, by
+    referring to them collectively as the items of the folder whose names
+    are in a list. (Reading gets the names and comments of the items in one
+    event; writing first gets the names of the items matched, so that the
+    comment is only set on files known to be there, and then sets it in a
+    second event.) Writing can only be done this way for files that are
+    given the same comment. If an event fails, or doesn't account for every
+    file, the files concerned are handled one at a time, so that errors are
+    reported for individual files.
+    '''
+
+    def __init__(self, batch_size = 1):
+        import threading
+        self.batch_size = batch_size
+        import appscript
+        self._local = threading.local()
+        self._shared = appscript.app('Finder')
+
+
+    def prepare_thread(self):
+        import appscript
+        self._local.finder = appscript.app('Finder')
+
+
+    def _finder(self):
+        return getattr(self._local, 'finder', self._shared)
+
+
+    def _item(self, file):
+        import mactypes
+        return self._finder().items[mactypes.Alias(file)]
+
+
+    def _items(self, folder, names):
+        import mactypes
+        from appscript import its
+        return self._finder().items[mactypes.Alias(folder)].items[its.name.isin(names)]
+
+
+    def read(self, file):
+        return self._item(file).comment()
+
+
+    def write(self, file, comment):
+        self._item(file).comment.set(comment)
+
+
+    def read_many(self, files):
+        if self.batch_size <= 1:
+            return super().read_many(files)
+        results = {}
+        for folder, names in _grouped(files, self.batch_size):
+            try:
+                from appscript import k
+                # Get names and comments in the same event, so that they can't
+                # get out of step if the folder changes in between.
+                found = {props[k.name]: props[k.comment]
+                         for props in self._items(folder, names).properties.get()}
+            except Exception as ex:             # noqa: PIE786
+                log(f'batch read of {len(names)} items in {folder} failed: {ex}')
+                found = {}
+            missing = [os.path.join(folder, name) for name in names if name not in found]
+            results.update(zip(missing, super().read_many(missing)))
+            results.update((os.path.join(folder, name), (found[name], None))
+                           for name in names if name in found)
+        return [results[os.path.abspath(file)] for file in files]
+
+
+    def write_many(self, pairs):
+        if self.batch_size <= 1:
+            return super().write_many(pairs)
+        errors = {}
+        # Only files that get the same comment can be set in the same event.
+        by_comment = {}
+        for file, comment in pairs:
+            by_comment.setdefault(comment, []).append(file)
+        for comment, files in by_comment.items():
+            for folder, names in _grouped(files, self.batch_size):
+                missing = names
+                if len(names) > 1:
+                    try:
+                        # Only report files as written if Finder matched them.
+                        found = set(self._items(folder, names).name.get())
+                        matched = [name for name in names if name in found]
+                        if matched:
+                            self._items(folder, matched).comment.set(comment)
+                            errors.update((os.path.join(folder, name), None)
+                                          for name in matched)
+                        missing = [name for name in names if name not in found]
+                    except Exception as ex:     # noqa: PIE786
+                        log(f'batch write of {len(names)} items in {folder} failed: {ex}')
+                paths = [os.path.join(folder, name) for name in missing]
+                singles = super().write_many([(path, comment) for path in paths])
+                errors.update(zip(paths, singles))
+        return [errors[os.path.abspath(file)] for file, _ in pairs]
+
+
+class XattrStore(CommentStore):
+    '''Read and write comments stored in a file's extended attributes.
+
+    The value is stored the same way macOS stores the Spotlight copy of the
+    Finder comment: as a binary property list containing a single string.
+    Note that Finder itself keeps the comments it displays in .DS_Store
+    files, so changes made this way may not be shown by Finder's "Get Info"
+    panel, although Spotlight and this program will see them.
+    '''
+
+    def __init__(self, attribute = _XATTR_NAME):
+        self.attribute = attribute
+        if hasattr(os, 'getxattr'):
+            self._getxattr, self._setxattr = os.getxattr, os.setxattr
+        else:
+            # Python's os module lacks xattr functions on macOS.
+            try:
+                import xattr
+            except ImportError:
+                raise RuntimeError('The xattr backend requires the Python'
+                                   ' package "xattr" on this platform.') from None
+            self._getxattr, self._setxattr = xattr.getxattr, xattr.setxattr
+
+
+    def read(self, file):
+        import plistlib
+        try:
+            value = self._getxattr(file, self.attribute)
+        except OSError as ex:
+            if ex.errno in _NO_ATTR_ERRNOS:
+                return ''
+            raise
+        comment = plistlib.loads(value) if value else ''
+        return comment if isinstance(comment, str) else str(comment)
+
+
+    def write(self, file, comment):
+        import plistlib
+        value = plistlib.dumps(comment, fmt = plistlib.FMT_BINARY)
+        self._setxattr(file, self.attribute, value)
+
+
+class MemoryStore(CommentStore):
+    '''Keep comments in a dict, indexed by the absolute paths of files.'''
+
+    def __init__(self, comments = None):
+        self.comments = {} if comments is None else comments
+
+
+    def read(self, file):
+        return self.comments.get(os.path.abspath(file), '')
+
+
+    def write(self, file, comment):
+        self.comments[os.path.abspath(file)] = comment
+
+
+class JSONStore(MemoryStore):
+    '''Keep comments in a JSON file, indexed by the absolute paths of files.
+
+    Changes are kept in memory until flush() or close() is called, at which
+    point the whole file is rewritten.
+    '''
+
+    def __init__(self, path):
+        import json
+        self.path = path
+        self._changed = False
+        comments = {}
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, 'r', encoding = 'utf-8') as f:
+                comments = json.load(f)
+        super().__init__(comments)
+
+
+    def write(self, file, comment):
+        super().write(file, comment)
+        self._changed = True
+
+
+    def flush(self):
+        import json
+        if not self._changed:
+            return
+        # Write to a temporary file first so that a crash can't corrupt it.
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w', encoding = 'utf-8') as f:
+            json.dump(self.comments, f, indent = 1, ensure_ascii = False)
+        os.replace(tmp, self.path)
+        self._changed = False
+
+
+# Miscellaneous utilities.
+# .............................................................................
+
+def comment_store(backend = 'finder'):
+    '''Return a CommentStore object for the named backend.
+
+    The value of backend can be "finder", "finder:N", "xattr", "memory", or
+    "json:FILE", where N is the number of files to handle per Apple Event
+    (see FinderStore) and FILE is the path of a JSON file (which will be
+    created if needed).
+    '''
+    name, _, arg = backend.partition(':')
+    name = name.lower()
+    if name == 'finder' and (not arg or (arg.isdigit() and int(arg) > 0)):
+        return FinderStore(int(arg) if arg else 1)
+    elif name == 'xattr':
+        return XattrStore()
+    elif name == 'memory':
+        return MemoryStore()
+    elif name == 'json' and arg:
+        return JSONStore(arg)
+    raise ValueError(f'Unrecognized backend: {backend}. The valid values'
+                     f' are {", ".join(BACKENDS)}.')
+
+
+def _grouped(files, size):
+    '''Yield (folder, names) tuples for up to size files at a time.'''
+    by_folder = {}
+    for file in files:
+        folder, name = os.path.split(os.path.abspath(file))
+        by_folder.setdefault(folder, []).append(name)
+    for folder, names in by_folder.items():
+        for i in range(0, len(names), size):
+            yield folder, names[i:i + size]
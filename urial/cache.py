@@ -0,0 +1,147 @@
+'''
+cache.py: bounded cache of the results of examining chunks of text for URIs
+
+Comments written from templates, and comments that mention the same links
+over and over, contain the same chunks of text (runs of characters between
+separators) many times. A ChunkCache remembers what the URI scanner found in
+recently seen chunks, so that trimming a chunk and parsing its scheme are
+done only once per distinct chunk. The cache holds a limited number of
+entries, discarding the least recently used ones when full, and counts its
+hits and misses. It can be saved to a file and loaded again, so that
+repeated runs of urial over the same files can benefit from it.
+
+To have the scanner use a cache, pass it to urial.scanner.set_cache().
+
+Copyright 2024 Michael Hucka.
+
+Licensed under the MIT License – see file "LICENSE" in the project website.
+For more information, please visit https://github.com/mhucka/urial
+'''
+
+from   collections import OrderedDict
+import json
+import os
+from   sidetrack import log
+import threading
+
+
+# Constants.
+# .............................................................................
+
+DEFAULT_SIZE = 100000
+
+
+# Class definitions.
+# .............................................................................
+
+class ChunkCache():
+    '''Least-recently-used cache of up to maxsize entries.
+
+    Keys are (chunk, strict) tuples, and values are the (start, end, scheme)
+    tuples produced by the scanner for the chunk, with the start and end of
+    the URI given relative to the start of the chunk (and scheme None if the
+    chunk contains no URI). The attributes "hits" and "misses" count the
+    results of calls to get(). Instances can be shared between threads.
+    '''
+
+    def __init__(self, maxsize = DEFAULT_SIZE):
+        if maxsize < 1:
+            raise ValueError(f'Invalid cache size: {maxsize}')
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+
+    def __len__(self):
+        return len(self._entries)
+
+
+    def get(self, key, default = None):
+        '''Return the value for key, or default if the key is not present.'''
+        with self._lock:
+            try:
+                value = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+
+    def put(self, key, value):
+        '''Store the value for key, discarding the oldest entry if full.'''
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last = False)
+
+
+    def clear(self):
+        '''Remove all entries and reset the hit and miss counts.'''
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+
+    def stats(self):
+        '''Return a dict with the counts of hits, misses and entries.'''
+        return {'hits': self.hits, 'misses': self.misses,
+                'size': len(self._entries), 'maxsize': self.maxsize}
+
+
+    def save(self, path):
+        '''Write the entries of the cache to the file at path.'''
+        from urial import __version__
+        with self._lock:
+            entries = [[chunk, strict, *value] for (chunk, strict), value
+                       in self._entries.items()]
+        # Write to a temporary file first so that a crash can't corrupt it.
+        tmp = path + '.tmp'
+        with open(tmp, 'w', encoding = 'utf-8') as f:
+            json.dump({'version': __version__, 'entries': entries}, f,
+                      ensure_ascii = False, separators = (',', ':'))
+        os.replace(tmp, path)
+
+
+    @classmethod
+    def load(cls, path, maxsize = DEFAULT_SIZE):
+        '''Return a ChunkCache with the entries saved in the file at path.
+
+        If the file does not exist, or was written by a different version of
+        urial (whose rules for finding URIs might be different), the cache
+        returned is empty. If the file does not contain a saved cache, this
+        raises ValueError.
+        '''
+        from urial import __version__
+        cache = cls(maxsize)
+        if not os.path.exists(path):
+            return cache
+        with open(path, 'r', encoding = 'utf-8') as f:
+            content = json.load(f)
+        if not isinstance(content, dict) or not isinstance(content.get('entries'), list):
+            raise ValueError(f'{path} does not contain a saved cache')
+        if content.get('version') != __version__:
+            log(f'ignoring cache in {path} from urial version {content.get("version")}')
+            return cache
+        # The most recently used entries come last; keep them if too many.
+        for entry in content['entries'][-maxsize:]:
+            if not _valid_entry(entry):
+                raise ValueError(f'{path} contains an invalid cache entry: {entry!r}')
+            chunk, strict, start, end, scheme = entry
+            cache._entries[(chunk, strict)] = (start, end, scheme)
+        log(f'loaded {len(cache)} cache entries from {path}')
+        return cache
+
+
+# Miscellaneous helpers.
+# .............................................................................
+
+def _valid_entry(entry):
+    return (isinstance(entry, list) and len(entry) == 5
+            and isinstance(entry[0], str) and isinstance(entry[1], bool)
+            and all(isinstance(value, int) for value in entry[2:4])
+            and (entry[4] is None or isinstance(entry[4], str)))
@@ -0,0 +1,98 @@
+'''
+client.py: thin client for a running Urial server
+
+This sends one request to a Urial server started with "urial --serve" and
+prints the result, in the same way that the urial command would. It avoids
+importing anything outside the Python standard library, so that it starts
+as quickly as possible.
+
+Copyright 2024 Michael Hucka.
+
+Licensed under the MIT License – see file "LICENSE" in the project website.
+For more information, please visit https://github.com/mhucka/urial
+'''
+
+import json
+import os
+import socket
+import sys
+
+
+# Principal functions.
+# .............................................................................
+
+def default_socket_path():
+    '''Return the socket path used when none is given explicitly.'''
+    if path := os.environ.get('URIAL_SOCKET'):
+        return path
+    tmpdir = os.environ.get('TMPDIR', '/tmp')
+    return os.path.join(tmpdir, f'urial-{os.getuid()}.sock')
+
+
+def request(socket_path, **fields):
+    '''Send a request to the server at socket_path and return its reply.
+
+    The keyword arguments can be "mode", "print", "strict", "uri" and "file";
+    they have the same meanings as the corresponding urial command-line
+    options and arguments. The reply is a dict; see server.py.
+    '''
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        sock.sendall(json.dumps(fields).encode('utf-8') + b'\n')
+        with sock.makefile('r', encoding = 'utf-8') as replies:
+            return json.loads(replies.readline())
+
+
+# Main entry point.
+# .............................................................................
+
+def main(argv = None):
+    '''Parse the command-line arguments, send a request, and print the result.'''
+    import argparse
+    parser = argparse.ArgumentParser(prog = 'urial-client',
+                                     description = 'Send a request to a'
+                                     ' running urial server (see "urial --serve").')
+    parser.add_argument('-m', '--mode', default = 'update',
+                        help = 'how to handle existing comment')
+    parser.add_argument('-p', '--print', dest = 'print_',
+                        help = 'print the comment or the URI, and exit')
+    parser.add_argument('-s', '--strict', action = 'store_true',
+                        help = 'be strict about recognizing URIs')
+    parser.add_argument('-S', '--socket', default = default_socket_path(),
+                        help = 'path of the server socket')
+    parser.add_argument('args', nargs = '+',
+                        help = 'one or more URIs followed by a file name')
+    opts = parser.parse_args(argv)
+
+    if opts.print_:
+        uri, file = None, opts.args[0]
+    elif len(opts.args) < 2:
+        parser.error('must be given at least two arguments: a URI and a file path')
+    else:
+        uris, file = opts.args[:-1], opts.args[-1]
+        uri = uris[0] if len(uris) == 1 else uris
+
+    try:
+        reply = request(opts.socket, mode = opts.mode, print = opts.print_,
+                        strict = opts.strict, uri = uri, file = os.path.abspath(file))
+    except OSError as ex:
+        print(f'‼️  Could not contact urial server at {opts.socket}: {ex}')
+        return 1
+    if 'error' in reply:
+        print('‼️  ' + reply['error'])
+        return 1
+    if 'comment' in reply:
+        print(reply['comment'])
+    elif reply.get('uris'):
+        print('\n'.join(reply['uris']))
+    return 0
+
+
+# The following entry point definition is for the console_scripts keyword
+# option to setuptools.
+def console_scripts_main():
+    sys.exit(main())
+
+
+if __name__ == '__main__':
+    console_scripts_main()
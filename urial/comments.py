@@ -0,0 +1,215 @@
+'''
+comments.py: functions for adding URIs to comments and updating files
+
+The functions in this module carry out the central work of Urial: computing
+the new value of a comment given one or more URIs to add to it, and reading
+and writing the comments of files through a comment store (see backends.py).
+They are used by the command-line interface as well as by the server, the
+asyncio interface, and the plan functions.
+
+Copyright 2024 Michael Hucka.
+
+Licensed under the MIT License – see file "LICENSE" in the project website.
+For more information, please visit https://github.com/mhucka/urial
+'''
+
+from   sidetrack import log
+import sys
+
+
+# Principal functions.
+# .............................................................................
+
+def processed(store, file, uri, mode, show, strict, scheme = None):
+    '''Carry out the requested action on one file and return a result dict.
+
+    The value of store must be a CommentStore object (see backends.py). When
+    called in batch mode, the caller passes the same store for every file, so
+    that the connection to Finder (or other setup work) is made only once.
+    The value of uri can also be a list of URIs, in which case the comment is
+    read and written only once for all of them, and the values of "uri" and
+    "action" in the result are lists. If scheme is given, only URIs with that
+    scheme are returned when show is "uri".
+    '''
+    if problem := item_problem(file, uri, show):
+        raise ValueError(problem)
+    log('reading comment of file ' + file)
+    result, new_comment = result_for(store.read(file), uri, mode, show, strict, scheme)
+    if new_comment is not None:
+        store.write(file, new_comment)
+    return result
+
+
+def processed_many(store, items, mode, show, strict, scheme = None):
+    '''Carry out the requested action on several files, and return results.
+
+    This is like processed(), but takes a list of (uri, file) tuples (whose
+    files must all be different), and uses the store's read_many() and
+    write_many() methods, so that stores that can handle many files at once
+    need fewer round trips. Returns a list of result dicts in the same order
+    as the items; for items that could not be processed, the dict has the
+    key "error" with a description of the problem.
+    '''
+    results = [None] * len(items)
+    todo = []
+    for i, (uri, file) in enumerate(items):
+        if problem := item_problem(file, uri, show):
+            results[i] = {'error': problem}
+        else:
+            todo.append(i)
+    log(f'reading comments of {len(todo)} files')
+    writes = []
+    for i, (comment, error) in zip(todo, store.read_many([items[i][1] for i in todo])):
+        if error:
+            results[i] = {'error': str(error)}
+            continue
+        try:
+            results[i], new_comment = result_for(comment, items[i][0], mode, show,
+                                                 strict, scheme)
+        except Exception as ex:             # noqa: PIE786
+            results[i] = {'error': str(ex)}
+            continue
+        if new_comment is not None:
+            writes.append((i, new_comment))
+    errors = store.write_many([(items[i][1], comment) for i, comment in writes])
+    for (i, _), error in zip(writes, errors):
+        if error:
+            results[i] = {'error': str(error)}
+    return results
+
+
+def result_for(comment, uri, mode, show, strict, scheme = None):
+    '''Return a tuple of (result dict, new comment) for a file's comment.
+
+    The arguments have the same meanings as for processed(). The new comment
+    is None if the comment does not need to be written.
+    '''
+    if show == 'comment':
+        return {'comment': comment}, None
+    elif show:
+        from urial.scanner import uris_in_text
+        return {'uris': uris_in_text(comment, strict, scheme = scheme)}, None
+    if isinstance(uri, str):
+        new_comment, action = updated_comment(comment, uri, mode, strict)
+    else:
+        new_comment, action = updated_comment_all(comment, uri, mode, strict)
+    if new_comment is None or new_comment == comment:
+        # Writing is by far the most expensive part, so skip no-op writes.
+        if timing := sys.modules.get('urial.timing'):
+            timing.count('writes_skipped', 1)
+        unchanged = 'unchanged' if isinstance(uri, str) else ['unchanged'] * len(uri)
+        return {'uri': uri, 'action': unchanged}, None
+    return {'uri': uri, 'action': action}, new_comment
+
+
+def updated_comment(comment, uri, mode = 'update', strict = False):
+    '''Return a tuple of (new comment, action) for adding uri to comment.
+
+    The value of mode must be one of "update", "append", "prepend", or
+    "overwrite"; see the help text of main() for their meanings. If the
+    comment does not need to be changed, the new comment value is None.
+    '''
+    new_comment, actions = updated_comment_all(comment, [uri], mode, strict)
+    return new_comment, actions[0]
+
+
+def updated_comment_all(comment, uris, mode = 'update', strict = False):
+    '''Return a tuple of (new comment, actions) for adding uris to comment.
+
+    This is like updated_comment(), but for a list of URIs (typically of
+    different schemes), all of which are added to the comment in one go: the
+    comment is scanned for URIs at most once. In update mode, each URI given
+    replaces the first URI of the same scheme in the comment that has not
+    already been replaced. The value of actions is a list of the actions
+    taken for each of the URIs, in the same order. A URI given more than once
+    is only added once, and its action is repeated for each occurrence.
+    '''
+    uris = list(uris)
+    unique = list(dict.fromkeys(uris))
+    new_comment, actions = _updated_comment(comment, unique, mode, strict)
+    if len(unique) < len(uris):
+        action_of = dict(zip(unique, actions))
+        actions = [action_of[uri] for uri in uris]
+    return new_comment, actions
+
+
+# Miscellaneous utilities.
+# .............................................................................
+
+def item_problem(file, uri, show):
+    '''Return a description of what is wrong with a batch item, if anything.
+
+    The value of uri can also be an exception, for an item that could not be
+    read from the batch input; the description is then that of the exception.
+    '''
+    from os.path import exists
+    if isinstance(uri, Exception):
+        return str(uri)
+    if not file:
+        return 'File name must not be an empty string.'
+    if not exists(file):
+        return f'File does not appear to exist: {file}'
+    if show:
+        return None
+    from uritools import urisplit
+    for value in ([uri] if isinstance(uri, str) or not uri else uri):
+        if not (value and isinstance(value, str) and urisplit(value).scheme):
+            return f'Could not interpret value "{value}" as a URI.'
+    return None
+
+
+def _updated_comment(comment, uris, mode, strict):
+    # Body of updated_comment_all(), for a list of distinct URIs.
+    if not comment:
+        log('file has no comment, so writing ' + ' '.join(uris))
+        return '\n'.join(uris), ['written'] * len(uris)
+    elif mode == 'overwrite':
+        # There's a comment, but overwrite mode is in effect.
+        log('overwriting existing Finder comment with ' + ' '.join(uris))
+        return '\n'.join(uris), ['overwritten'] * len(uris)
+    actions = []
+    added = []
+    replacements = {}
+    matches = None
+    for uri in uris:
+        if uri in comment:
+            log('comment already contains the same URI: ' + uri)
+            actions.append('unchanged')
+        elif mode in ['append', 'prepend']:
+            log(f'{mode}ing to existing Finder comment the string {uri}')
+            added.append(uri)
+            actions.append(mode + 'ed')
+        else:
+            # Check if there's a URI with the same scheme in the comment.
+            from uritools import urisplit
+            if matches is None:
+                from urial.scanner import iter_uris
+                # If all the URIs have the same scheme, only look for that one.
+                schemes = {urisplit(uri).scheme.lower() for uri in uris}
+                only = schemes.pop() if len(schemes) == 1 else None
+                matches = list(iter_uris(comment, strict, only))
+            scheme = urisplit(uri).scheme
+            found = next((m for m in matches if m.scheme == scheme
+                          and m.start not in replacements), None)
+            if found:
+                log(f'replacing {found.uri} with {uri}')
+                replacements[found.start] = (found, uri)
+                actions.append('replaced')
+            else:
+                # Didn't find a URI of the same kind and we're not appending.
+                log('nothing to do for ' + uri)
+                actions.append('unchanged')
+    if not added and not replacements:
+        return None, actions
+    if mode == 'append':
+        return '\n'.join([comment] + added), actions
+    elif mode == 'prepend':
+        return '\n'.join(added + [comment]), actions
+    pieces = []
+    last = 0
+    for start in sorted(replacements):
+        found, uri = replacements[start]
+        pieces += [comment[last:start], uri]
+        last = found.end
+    pieces.append(comment[last:])
+    return ''.join(pieces), actions
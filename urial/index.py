@@ -0,0 +1,196 @@
+'''
+index.py: persistent index of the URIs found in the comments of files
+
+Answering the question "which file has this URI in its comment?" otherwise
+requires reading the comments of every file. A URIIndex keeps the URIs found
+in the comments of files in an SQLite database, so that the question can be
+answered in milliseconds, and refreshes the database incrementally: files
+whose inode number, size and modification & status change times are the same
+as the last time they were indexed are not read again. (The status change
+time is included because setting a comment changes a file's extended
+attributes, which updates that time but not the modification time.)
+
+Copyright 2024 Michael Hucka.
+
+Licensed under the MIT License – see file "LICENSE" in the project website.
+For more information, please visit https://github.com/mhucka/urial
+'''
+
+import os
+from   sidetrack import log
+import sqlite3
+
+
+# Constants.
+# .............................................................................
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS files (
+    id          INTEGER PRIMARY KEY,
+    path        TEXT UNIQUE NOT NULL,
+    signature   TEXT NOT NULL,
+    generation  INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS uris (
+    file_id     INTEGER NOT NULL REFERENCES files(id) ON DELETE CASCADE,
+    uri         TEXT NOT NULL,
+    PRIMARY KEY (file_id, uri)
+);
+CREATE INDEX IF NOT EXISTS uris_by_uri ON uris (uri);
+'''
+
+# Number of files to process between commits of the database transaction.
+_COMMIT_INTERVAL = 1000
+
+
+# Class definitions.
+# .............................................................................
+
+class URIIndex():
+    '''Index of file paths to URIs and URIs to file paths, kept in SQLite.'''
+
+    def __init__(self, path):
+        self.path = path
+        self._db = sqlite3.connect(path)
+        self._db.execute('PRAGMA foreign_keys = ON')
+        self._db.execute('PRAGMA journal_mode = WAL')
+        self._db.executescript(_SCHEMA)
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *_):
+        self.close()
+
+
+    def close(self):
+        self._db.close()
+
+
+    def refresh(self, store, roots, strict = False, workers = 8,
+                include = None, exclude = None):
+        '''Update the index for the files in the given directory trees.
+
+        The value of store must be a CommentStore object (see backends.py).
+        Only files that are new or have changed since the last refresh are
+        read; files that no longer exist are removed from the index. The
+        remaining arguments have the same meanings as for the functions
+        files_in() and comments_of() in tree.py, and uris_in_text() in
+        scanner.py. Returns a dict of counts of files read, unchanged,
+        removed, and failed (i.e., whose comments could not be read).
+        '''
+        from itertools import chain
+        from urial.scanner import uris_in_text
+        from urial.tree import files_in, comments_of
+
+        stats = {'read': 0, 'unchanged': 0, 'removed': 0, 'failed': 0}
+        generation = int(self._meta('generation', '0')) + 1
+        # If strictness changed, the URIs found in all the files may differ.
+        if self._meta('strict') != str(bool(strict)):
+            self._db.execute('UPDATE files SET signature = ?', ('',))
+        self._set_meta('strict', str(bool(strict)))
+        self._set_meta('generation', str(generation))
+
+        roots = [os.path.abspath(root) for root in roots]
+        paths = chain.from_iterable(files_in(root, include, exclude) for root in roots)
+        # The signature of each file read has to be remembered until the read
+        # finishes, but reads in progress are bounded by comments_of().
+        signatures = {}
+
+        def changed_files():
+            # Yields the files that need to be read, and marks the rest seen.
+            for path in paths:
+                signature = _signature(path)
+                row = self._db.execute('SELECT signature FROM files WHERE path = ?',
+                                       (path,)).fetchone()
+                if row and row[0] == signature:
+                    self._db.execute('UPDATE files SET generation = ? WHERE path = ?',
+                                     (generation, path))
+                    stats['unchanged'] += 1
+                    self._maybe_commit(stats)
+                else:
+                    signatures[path] = signature
+                    yield path
+
+        for path, comment, error in comments_of(store, changed_files(), workers):
+            signature = signatures.pop(path)
+            if error:
+                log(f'could not read comment of {path}: {error}')
+                stats['failed'] += 1
+                # Leave it to be retried (and not removed) next time.
+                signature = ''
+            else:
+                stats['read'] += 1
+            uris = set(uris_in_text(comment, strict)) if comment else set()
+            self._store(path, signature, generation, uris, replace = not error)
+            self._maybe_commit(stats)
+
+        # Anything under the roots that wasn't seen this time is gone.
+        for root in roots:
+            cursor = self._db.execute(
+                'DELETE FROM files WHERE generation < ?'
+                ' AND (path = ? OR substr(path, 1, ?) = ?)',
+                (generation, root, len(root) + 1, os.path.join(root, '')))
+            stats['removed'] += cursor.rowcount
+        self._db.commit()
+        return stats
+
+
+    def files_with(self, uri):
+        '''Return a list of the paths of files whose comments contain uri.'''
+        rows = self._db.execute('SELECT path FROM files JOIN uris ON id = file_id'
+                                ' WHERE uri = ? ORDER BY path', (uri,))
+        return [row[0] for row in rows]
+
+
+    def uris_of(self, path):
+        '''Return a list of the URIs found in the comment of the given file.'''
+        rows = self._db.execute('SELECT uri FROM files JOIN uris ON id = file_id'
+                                ' WHERE path = ? ORDER BY uri', (os.path.abspath(path),))
+        return [row[0] for row in rows]
+
+
+    def _store(self, path, signature, generation, uris, replace = True):
+        row = self._db.execute('SELECT id FROM files WHERE path = ?', (path,)).fetchone()
+        if row:
+            file_id = row[0]
+            self._db.execute('UPDATE files SET signature = ?, generation = ?'
+                             ' WHERE id = ?', (signature, generation, file_id))
+            if not replace:
+                return
+            self._db.execute('DELETE FROM uris WHERE file_id = ?', (file_id,))
+        else:
+            file_id = self._db.execute(
+                'INSERT INTO files (path, signature, generation) VALUES (?, ?, ?)',
+                (path, signature, generation)).lastrowid
+        self._db.executemany('INSERT INTO uris (file_id, uri) VALUES (?, ?)',
+                             ((file_id, uri) for uri in uris))
+
+
+    def _maybe_commit(self, stats):
+        if sum(stats.values()) % _COMMIT_INTERVAL == 0:
+            self._db.commit()
+
+
+    def _meta(self, key, default = None):
+        row = self._db.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else default
+
+
+    def _set_meta(self, key, value):
+        self._db.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                         (key, value))
+
+
+# Miscellaneous helpers.
+# .............................................................................
+
+def _signature(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return ''
+    return f'{st.st_ino}:{st.st_size}:{st.st_mtime_ns}:{st.st_ctime_ns}'
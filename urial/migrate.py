@@ -0,0 +1,152 @@
+'''
+migrate.py: replace old URIs with new ones throughout the comments of files
+
+When the URIs of many items change at once (for example, because a
+DEVONthink database was rebuilt and its items were given new UUIDs), the
+comments of the files that refer to those items need to be updated. The
+classes and functions in this module take a table of old and new URIs, and
+rewrite every URI in a comment that appears in the table, in a single pass
+over the comment.
+
+The table is read once and kept in memory in hash tables, so that looking up
+a URI takes the same time whether the table has ten entries or a million.
+Besides exact URIs, the table can contain URI prefixes (e.g., to move every
+URI below "https://old.example.com/" to a new site). Prefixes are stored in
+hash tables keyed by prefix length, and a URI is matched against the longest
+prefix in the table by trying each distinct prefix length from the longest
+down, which is fast because a table usually contains prefixes of only a few
+different lengths.
+
+Copyright 2024 Michael Hucka.
+
+Licensed under the MIT License – see file "LICENSE" in the project website.
+For more information, please visit https://github.com/mhucka/urial
+'''
+
+from   sidetrack import log
+
+
+# Class definitions.
+# .............................................................................
+
+class URIMapping():
+    '''Table of old URIs (or URI prefixes) and the URIs that replace them.'''
+
+    def __init__(self, pairs = ()):
+        self.exact = {}
+        # Prefix tables, indexed by prefix length.
+        self._prefixes = {}
+        self._lengths = []
+        for old, new in pairs:
+            self.add(old, new)
+
+
+    def __len__(self):
+        return len(self.exact) + sum(len(table) for table in self._prefixes.values())
+
+
+    def add(self, old, new):
+        '''Add a mapping from URI old to URI new.
+
+        If old ends with "*", it is a prefix: any URI that begins with it
+        (without the "*") is mapped to new (without a trailing "*", if any)
+        followed by the rest of the URI.
+        '''
+        if not old.endswith('*'):
+            self.exact[old] = new
+            return
+        old, new = old[:-1], new[:-1] if new.endswith('*') else new
+        length = len(old)
+        if length not in self._prefixes:
+            self._prefixes[length] = {}
+            self._lengths = sorted(self._prefixes, reverse = True)
+        self._prefixes[length][old] = new
+
+
+    def lookup(self, uri):
+        '''Return the replacement for the given URI, or None if it has none.'''
+        if (new := self.exact.get(uri)) is not None:
+            return new
+        for length in self._lengths:
+            if length > len(uri):
+                continue
+            if (new := self._prefixes[length].get(uri[:length])) is not None:
+                return new + uri[length:]
+        return None
+
+
+    @classmethod
+    def from_file(cls, path):
+        '''Return a URIMapping object with the contents of the file at path.
+
+        Each line of the file can be an old URI and a new URI separated by a
+        tab character, or a JSON object with "old" and "new" keys. Blank
+        lines and lines beginning with "#" are skipped.
+        '''
+        mapping = cls()
+        with open(path, encoding = 'utf-8') as f:
+            for num, line in enumerate(f, 1):
+                line = line.rstrip('\r\n')
+                if not line.strip() or line.startswith('#'):
+                    continue
+                if line.lstrip().startswith('{'):
+                    from json import loads
+                    item = loads(line)
+                    old, new = item.get('old'), item.get('new')
+                else:
+                    old, _, new = line.partition('\t')
+                if not old or not new:
+                    raise ValueError(f'Line {num} of {path} is not an old/new URI pair.')
+                mapping.add(old, new)
+        log(f'read {len(mapping)} URI mappings from {path}')
+        return mapping
+
+
+# Principal functions.
+# .............................................................................
+
+def migrated_comment(comment, mapping, strict = False):
+    '''Return a tuple of (new comment, changes) for comment using mapping.
+
+    The value of mapping must be a URIMapping object. Every URI found in the
+    comment that has a replacement in the mapping is replaced. The value of
+    changes is a list of (old URI, new URI) tuples; if it is empty, the new
+    comment value is None.
+    '''
+    from urial.scanner import iter_uris
+    pieces = []
+    changes = []
+    last = 0
+    for match in iter_uris(comment, strict):
+        new = mapping.lookup(match.uri)
+        if new is not None and new != match.uri:
+            pieces.append(comment[last:match.start])
+            pieces.append(new)
+            last = match.end
+            changes.append((match.uri, new))
+    if not changes:
+        return None, changes
+    pieces.append(comment[last:])
+    return ''.join(pieces), changes
+
+
+def migrations(store, roots, mapping, strict = False, workers = 8,
+               include = None, exclude = None):
+    '''Yield the changes needed to migrate the comments of files under roots.
+
+    Comments are read concurrently using urial.tree.comments_of(). Yields
+    (file, old comment, new comment, changes, error) tuples for the files
+    whose comments need to change and the files whose comments could not be
+    read (for which error is the exception raised, and the other values are
+    None). Nothing is written; that is left to the caller.
+    '''
+    from itertools import chain
+    from urial.tree import files_in, comments_of
+    files = chain.from_iterable(files_in(root, include, exclude) for root in roots)
+    for file, comment, error in comments_of(store, files, workers):
+        if error:
+            yield file, None, None, None, error
+        elif comment:
+            new_comment, changes = migrated_comment(comment, mapping, strict)
+            if changes:
+                yield file, comment, new_comment, changes, None
@@ -0,0 +1,237 @@
+'''
+plan.py: two-phase bulk updates of comments, with a write-ahead journal
+
+Updating the comments of many files in one go has two problems: there's no
+way to see what will change before it happens, and if the process is
+interrupted partway through, some files are updated and others are not.
+The functions in this module split the work into two phases:
+
+  1. make_plan() reads the current comments and computes the new ones,
+     without writing anything. Entries whose new comment is the same as the
+     old one are dropped. The result can be saved with write_plan().
+
+  2. apply_plan() performs the writes listed in a saved plan. Before each
+     group of writes, it records what it's about to do in a journal file
+     next to the plan file (and forces it to disk); after the writes, it
+     records that they were done. If the process is interrupted, running
+     apply_plan() again resumes where it left off, and rollback_plan()
+     restores the old comments of the files that were changed.
+
+Before writing a file's comment, apply_plan() checks that the comment is
+still what it was when the plan was made, and skips the file if not, so
+that changes made by someone else in the meantime are not overwritten.
+
+Copyright 2024 Michael Hucka.
+
+Licensed under the MIT License – see file "LICENSE" in the project website.
+For more information, please visit https://github.com/mhucka/urial
+'''
+
+import json
+import os
+from   sidetrack import log
+
+
+# Constants.
+# .............................................................................
+
+# Minimum number of writes to perform between forcing the journal to disk.
+_CHUNK_SIZE = 100
+
+
+# Principal functions.
+# .............................................................................
+
+def make_plan(store, items, mode = 'update', strict = False):
+    '''Return a list of planned changes for the given (uri, file) items.
+
+    The value of store must be a CommentStore object (see backends.py). Each
+    entry in the list returned is a dict with the keys "file", "uris" (the
+    URIs added for that file), "actions", "old" (the current comment) and
+    "new" (the planned comment). Files mentioned more than once are combined
+    into one entry. Items for which nothing would change are left out, and
+    items that can't be processed (e.g., because the file does not exist) are
+    returned in a second list, as (file, error message) tuples.
+    '''
+    from urial.comments import updated_comment_all, item_problem
+    entries = {}
+    errors = []
+    for uri, file in items:
+        try:
+            if problem := item_problem(file, uri, False):
+                raise ValueError(problem)
+            path = os.path.abspath(file)
+            if path not in entries:
+                entries[path] = {'file': path, 'uris': [], 'actions': [],
+                                 'old': store.read(path)}
+            entry = entries[path]
+            comment = entry.get('new', entry['old'])
+            uris = [uri] if isinstance(uri, str) else uri
+            new_comment, actions = updated_comment_all(comment, uris, mode, strict)
+            if new_comment is not None and new_comment != comment:
+                entry['uris'] += uris
+                entry['actions'] += actions
+                entry['new'] = new_comment
+        except Exception as ex:             # noqa: PIE786
+            log(f'error planning change to {file}: {ex}')
+            errors.append((file, str(ex)))
+    planned = [entry for entry in entries.values()
+               if 'new' in entry and entry['new'] != entry['old']]
+    return planned, errors
+
+
+def write_plan(plan, path):
+    '''Write the plan (a list of dicts) to the file at path, as JSON lines.'''
+    with open(path, 'w', encoding = 'utf-8') as f:
+        for entry in plan:
+            f.write(json.dumps(entry, ensure_ascii = False) + '\n')
+
+
+def read_plan(path):
+    '''Yield the entries of the plan saved in the file at path.'''
+    with open(path, 'r', encoding = 'utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def journal_path(plan_path):
+    '''Return the path of the journal file used when applying a plan.'''
+    return plan_path + '.journal'
+
+
+def apply_plan(store, plan_path):
+    '''Perform the writes in the plan saved at plan_path, with journaling.
+
+    If a previous attempt to apply the same plan was interrupted, the files
+    that the journal records as done are skipped. Returns a dict of counts of
+    files "written", "skipped" (already done), "conflicts" (whose comment
+    had changed since the plan was made), and "failed" (whose comment could
+    not be read or written). Files that failed are not recorded as done, so
+    applying the plan again will try them again.
+    '''
+    journal = journal_path(plan_path)
+    done = {rec['file'] for rec in _journal_records(journal) if rec['step'] == 'done'}
+    stats = {'written': 0, 'skipped': 0, 'conflicts': 0, 'failed': 0}
+    with open(journal, 'a', encoding = 'utf-8') as jf:
+        chunk = []
+        for entry in read_plan(plan_path):
+            if entry['file'] in done:
+                stats['skipped'] += 1
+                continue
+            chunk.append(entry)
+            if len(chunk) >= max(_CHUNK_SIZE, store.batch_size):
+                _apply_chunk(store, chunk, jf, stats)
+                chunk = []
+        if chunk:
+            _apply_chunk(store, chunk, jf, stats)
+    return stats
+
+
+def rollback_plan(store, plan_path):
+    '''Restore the comments of files changed by applying the plan.
+
+    This uses the journal written by apply_plan(). Files whose comments have
+    been changed again since the plan was applied are left alone. When done,
+    the journal is removed, so that the plan can be applied again. Returns a
+    dict of counts of files "restored", "conflicts" and "failed" (whose
+    comment could not be read or written).
+    '''
+    journal = journal_path(plan_path)
+    begun = {}
+    for rec in _journal_records(journal):
+        if rec['step'] == 'begin':
+            begun[rec['file']] = rec
+        elif rec['step'] == 'skip':
+            # Not changed by apply_plan() because of a conflict.
+            begun.pop(rec['file'], None)
+    stats = {'restored': 0, 'conflicts': 0, 'failed': 0}
+    # Undo in the reverse of the order in which the changes were made.
+    for file, rec in reversed(list(begun.items())):
+        try:
+            current = store.read(file)
+        except Exception as ex:             # noqa: PIE786
+            log(f'error reading comment of {file}: {ex}')
+            stats['failed'] += 1
+            continue
+        if current == rec['old']:
+            continue
+        if current != rec['new']:
+            log(f'not restoring {file} because its comment has changed')
+            stats['conflicts'] += 1
+            continue
+        log(f'restoring old comment of {file}')
+        try:
+            store.write(file, rec['old'])
+        except Exception as ex:             # noqa: PIE786
+            log(f'error restoring comment of {file}: {ex}')
+            stats['failed'] += 1
+            continue
+        stats['restored'] += 1
+    store.flush()
+    if os.path.exists(journal):
+        os.unlink(journal)
+    return stats
+
+
+# Miscellaneous helpers.
+# .............................................................................
+
+def _apply_chunk(store, chunk, jf, stats):
+    # Write-ahead: record what's about to be done, and make sure it's on disk.
+    for entry in chunk:
+        record = {'step': 'begin', 'file': entry['file'],
+                  'old': entry['old'], 'new': entry['new']}
+        jf.write(json.dumps(record, ensure_ascii = False) + '\n')
+    _sync(jf)
+    finished = []
+    skipped = []
+    writes = []
+    # Use the batch methods, so that stores that can handle many files at
+    # once (e.g., FinderStore with a batch_size) need fewer round trips.
+    currents = store.read_many([entry['file'] for entry in chunk])
+    for entry, (current, error) in zip(chunk, currents):
+        if error:
+            log(f'error reading comment of {entry["file"]}: {error}')
+            stats['failed'] += 1
+        elif current == entry['new']:
+            # Written before an interruption, but not recorded as done.
+            finished.append(entry)
+        elif current != entry['old']:
+            log(f'not changing {entry["file"]} because its comment has changed')
+            stats['conflicts'] += 1
+            skipped.append(entry)
+        else:
+            log(f'writing new comment for {entry["file"]}')
+            writes.append(entry)
+    errors = store.write_many([(entry['file'], entry['new']) for entry in writes])
+    for entry, error in zip(writes, errors):
+        if error:
+            log(f'error writing comment of {entry["file"]}: {error}')
+            stats['failed'] += 1
+        else:
+            stats['written'] += 1
+            finished.append(entry)
+    store.flush()
+    for entry in finished:
+        jf.write(json.dumps({'step': 'done', 'file': entry['file']}) + '\n')
+    for entry in skipped:
+        jf.write(json.dumps({'step': 'skip', 'file': entry['file']}) + '\n')
+    _sync(jf)
+
+
+def _journal_records(journal):
+    if not os.path.exists(journal):
+        return
+    with open(journal, 'r', encoding = 'utf-8') as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                # A partial line left by a crash during writing.
+                continue
+
+
+def _sync(f):
+    f.flush()
+    os.fsync(f.fileno())
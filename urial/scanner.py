@@ -0,0 +1,401 @@
+'''
+scanner.py: find URIs in text
+
+There are two implementations ("engines") of the URI detection rules
+described in the help text of the urial command:
+
+  classic: the original implementation. It trims each chunk of text one
+           character at a time by slicing strings, which takes time
+           proportional to the square of the chunk length in the worst case
+           (e.g., long runs of nested parentheses or trailing punctuation).
+
+  linear:  (default) a single left-to-right pass over the text that uses
+           precompiled tables and index arithmetic instead of slicing, so
+           that its running time is proportional to the length of the text.
+
+Both engines produce identical results; the classic engine is kept for
+comparison and as a reference for testing.
+
+Copyright 2024 Michael Hucka.
+
+Licensed under the MIT License – see file "LICENSE" in the project website.
+For more information, please visit https://github.com/mhucka/urial
+'''
+
+import os
+import re
+import string
+import sys
+from   time import perf_counter
+from   uritools import urisplit
+
+
+# Constants.
+# .............................................................................
+# The syntax of URIs is defined in https://www.rfc-editor.org/rfc/rfc3986.
+
+_NON_URI_CHARS = r'"\<>^`{}|'
+_NON_URI_END = tuple(r".,:;'?!$([")
+
+# Used by the classic engine to turn separator characters into spaces.
+_SEPARATORS = string.whitespace + _NON_URI_CHARS
+_SPACE_REPLACEMENTS = str.maketrans(_SEPARATORS, ' '*len(_SEPARATORS))
+
+# Used by the linear engine. A chunk is a maximal run of non-separators.
+_CHUNK_RE = re.compile('[^' + re.escape(_SEPARATORS) + ']+')
+# Matches up to and including the last separator character in a text. Since
+# ".*" is greedy, this finds it by backtracking from the end of the text.
+_LAST_SEPARATOR_RE = re.compile('.*[' + re.escape(_SEPARATORS) + ']', re.DOTALL)
+_OPENERS = frozenset('([')
+_CLOSERS = frozenset(')]')
+_MATCHING = {'(': ')', '[': ']'}
+_NON_URI_END_CHARS = frozenset(_NON_URI_END)
+_TRIMMABLE_END_CHARS = _NON_URI_END_CHARS | _CLOSERS
+
+ENGINES = ['linear', 'classic']
+
+# Marks a missing cache entry (None means a chunk without a URI).
+_MISSING = object()
+
+
+# Global variables.
+# .............................................................................
+
+# Cache of chunk examination results used by the linear engine, if any.
+_cache = None
+
+
+# Principal functions.
+# .............................................................................
+
+def uris_in_text(text, strict = False, engine = 'linear', scheme = None):
+    '''Return a list of the URIs found in the given text.
+
+    If strict is true, URIs are only assumed to be delimited by whitespace and
+    the characters < > ^ " ` { | and }; otherwise, additional heuristics are
+    applied (see the help text for the urial command). The value of engine
+    selects the implementation used; it must be one of the values in ENGINES.
+    If scheme is given, only URIs with that scheme (compared without regard
+    to case) are returned; this is much faster than filtering the results,
+    because only the parts of the text around occurrences of the scheme
+    followed by a colon are examined.
+    '''
+    if engine == 'linear':
+        spans = _uri_spans(text, strict, scheme = scheme)
+        return [text[start:end] for start, end, _ in spans]
+    elif engine == 'classic':
+        uris = _classic_uris_in_text(text, strict)
+        if scheme is not None:
+            uris = [uri for uri in uris if urisplit(uri).scheme.lower() == scheme.lower()]
+        return uris
+    raise ValueError(f'Unrecognized engine: {engine}')
+
+
+def iter_uris(text, strict = False, scheme = None):
+    '''Yield a URIMatch object for each URI in the text, from left to right.
+
+    This finds the same URIs as uris_in_text(), but does so lazily, and the
+    objects returned record where each URI is located in the text and what
+    its scheme is. The parameters strict and scheme have the same meanings as
+    they do for uris_in_text().
+    '''
+    for start, end, found_scheme in _uri_spans(text, strict, scheme = scheme):
+        yield URIMatch(text[start:end], start, end, found_scheme)
+
+
+def scan_many(texts, strict = False, processes = 1, threshold = 20000,
+              scheme = None):
+    '''Return a list of lists of URIs found in each of the given texts.
+
+    This produces the same results as calling uris_in_text() on each of the
+    texts (the results are in the same order as the texts), but is faster
+    for large numbers of texts: texts that occur more than once are scanned
+    only once, and optionally, if the number of distinct texts is at least
+    threshold, the work is divided among a pool of processes. The number of
+    processes is given by processes; the default, 1, means to never use a
+    pool, and None means to use as many processes as there are CPUs. The
+    value of scheme has the same meaning as it does for uris_in_text().
+
+    Note that on macOS and Windows, new processes start by importing the
+    caller's main module, so a program that uses a pool must only call this
+    function from code guarded by "if __name__ == '__main__':".
+    '''
+    if not isinstance(texts, (list, tuple)):
+        texts = list(texts)
+    # Dicts preserve insertion order, so this also numbers the distinct texts.
+    distinct = dict.fromkeys(texts)
+    if processes is None:
+        processes = os.cpu_count() or 1
+    if len(distinct) >= threshold and processes > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        from itertools import repeat
+        unique = list(distinct)
+        with ProcessPoolExecutor(max_workers = processes) as pool:
+            # Use several chunks per process so that uneven chunks even out.
+            size = max(1000, len(unique) // (4 * processes) + 1)
+            chunks = (unique[i:i + size] for i in range(0, len(unique), size))
+            results = pool.map(_scanned, chunks, repeat(strict), repeat(scheme))
+            distinct = dict(zip(unique, (uris for chunk in results for uris in chunk)))
+    else:
+        distinct = dict(zip(distinct, _scanned(distinct, strict, scheme)))
+    # Give each text its own list, in case the caller modifies them.
+    return [distinct[text].copy() for text in texts]
+
+
+def unsurrounded(text):
+    '''Remove matched parentheses or brackets surrounding the text.'''
+    start, end = _unsurrounded_span(text, 0, len(text))
+    return text[start:end]
+
+
+def extracted_uri(text, strict = False):
+    '''Return the URI in a chunk of text (which has no separators), or ''.'''
+    examine = _examined_chunk if _cache is None else _cached_examined_chunk
+    start, end, scheme = examine(text, 0, len(text), strict)
+    return text[start:end] if scheme else ''
+
+
+def set_cache(cache):
+    '''Make the scanner use the given cache, and return the previous one.
+
+    The value of cache must be a ChunkCache object (see cache.py), or None to
+    stop using a cache. When a cache is in use, the results of examining each
+    distinct chunk of text for a URI are looked up in the cache before doing
+    the work, which saves time when the same chunks occur over and over.
+    '''
+    global _cache
+    previous, _cache = _cache, cache
+    return previous
+
+
+def get_cache():
+    '''Return the cache used by the scanner (see set_cache()), or None.'''
+    return _cache
+
+
+# Class definitions.
+# .............................................................................
+
+class URIMatch():
+    '''A URI found in a text, and the location of the URI in that text.
+
+    The attributes are the URI string, the start and end offsets of the URI
+    in the text (such that text[start:end] == uri), and the URI's scheme.
+    '''
+    __slots__ = ('uri', 'start', 'end', 'scheme')
+
+    def __init__(self, uri, start, end, scheme):
+        self.uri = uri
+        self.start = start
+        self.end = end
+        self.scheme = scheme
+
+
+    def __repr__(self):
+        return (f'URIMatch(uri={self.uri!r}, start={self.start},'
+                f' end={self.end}, scheme={self.scheme!r})')
+
+
+# Linear engine.
+# .............................................................................
+# The functions below work on spans (start and end offsets) of the original
+# text, so that trimming a character costs O(1) instead of O(n) for slicing.
+
+def _uri_spans(text, strict, start = 0, end = None, whole = True, scheme = None):
+    '''Yield (start, end, scheme) for each URI in the text, from left to right.
+
+    If start and end are given, only text[start:end] is scanned. The value of
+    whole must be false if that part of the text is only a piece of a larger
+    text (e.g., a block of a file), so that it isn't treated as surrounded by
+    parentheses or brackets just because it begins and ends with them. If
+    scheme is given, only URIs with that scheme are produced.
+    '''
+    # Counting is only possible if urial.timing has been loaded by someone.
+    timing = sys.modules.get('urial.timing')
+    counting = timing is not None and timing.counters is not None
+    started = perf_counter() if counting else 0
+    examined = found = 0
+    try:
+        end = len(text) if end is None else end
+        if whole:
+            # Do a first pass of this in case the whole text is surrounded.
+            start, end = _unsurrounded_span(text, start, end)
+        # Now find chunks that may be URIs or contain URIs embedded in them.
+        if scheme is None:
+            chunks = _CHUNK_RE.finditer(text, start, end)
+        else:
+            scheme = scheme.lower()
+            chunks = _chunks_with(scheme + ':', text, start, end)
+        examine = _examined_chunk if _cache is None else _cached_examined_chunk
+        for chunk in chunks:
+            chunk_start, chunk_end = chunk.span()
+            # Every URI has a colon after the scheme, so skip chunks lacking one.
+            if text.find(':', chunk_start, chunk_end) < 0:
+                continue
+            examined += 1
+            uri_start, uri_end, uri_scheme = examine(text, chunk_start, chunk_end, strict)
+            if uri_scheme and (scheme is None or uri_scheme.lower() == scheme):
+                found += 1
+                yield uri_start, uri_end, uri_scheme
+    finally:
+        if counting:
+            # The time includes any time the caller spent between results.
+            timing.count('texts_scanned', 1, 'chunks_examined', examined,
+                         'uris_found', found, 'scan_seconds', perf_counter() - started)
+
+
+def _examined_chunk(text, start, end, strict):
+    '''Return (start, end, scheme) of the URI in a chunk; scheme may be None.'''
+    uri_start, uri_end = _trimmed_span(text, start, end, strict)
+    if uri_start == uri_end:
+        return uri_start, uri_end, None
+    return uri_start, uri_end, _uri_scheme(text[uri_start:uri_end], strict)
+
+
+def _cached_examined_chunk(text, start, end, strict):
+    '''Like _examined_chunk(), but looks up the result in the cache first.'''
+    cache = _cache
+    key = (text[start:end], strict)
+    value = cache.get(key, _MISSING)
+    if value is _MISSING:
+        uri_start, uri_end, scheme = _examined_chunk(text, start, end, strict)
+        value = (uri_start - start, uri_end - start, scheme)
+        cache.put(key, value)
+    return start + value[0], start + value[1], value[2]
+
+
+def _scanned(texts, strict, scheme = None):
+    '''Return a list of the URIs in each text (this is run by worker processes).'''
+    spans = _uri_spans
+    return [[text[start:end] for start, end, _ in spans(text, strict, scheme = scheme)]
+            for text in texts]
+
+
+def _chunks_with(marker, text, start, end):
+    '''Yield a match object for each chunk of text that contains marker.'''
+    if not _CHUNK_RE.fullmatch(marker):
+        # Chunks can't contain separators, so none can contain the marker.
+        return
+    marker_re = re.compile(re.escape(marker), re.IGNORECASE)
+    while found := marker_re.search(text, start, end):
+        # The chunk begins after the last separator before the marker.
+        before = _LAST_SEPARATOR_RE.match(text, start, found.start())
+        chunk = _CHUNK_RE.match(text, before.end() if before else start, end)
+        yield chunk
+        start = chunk.end()
+
+
+def _unsurrounded_span(text, start, end):
+    # Loop in order to handle nested cases.
+    while start < end and text[start] in _OPENERS:
+        if text[end - 1] != _MATCHING[text[start]]:
+            break
+        start += 1
+        end -= 1
+    return start, end
+
+
+def _trimmed_span(text, start, end, strict):
+    # This follows the same steps as the classic engine's _classic_extracted_uri
+    # (see the comments there), but moves the start & end offsets instead of
+    # creating new strings. To avoid searching the remaining text for opening
+    # parens or brackets after every step, it keeps a running count of them.
+    openers = None
+    while start < end and (not text[start].isalpha()
+                           or (not strict and text[end - 1] in _TRIMMABLE_END_CHARS)):
+        # This is _unsurrounded_span() inlined, to avoid a function call for
+        # every character in long runs of unmatched ( or [ characters.
+        while start < end and text[start] in _OPENERS:
+            if text[end - 1] != _MATCHING[text[start]]:
+                break
+            if openers is not None:
+                openers -= 1
+            start += 1
+            end -= 1
+        if start >= end:
+            break
+        elif not text[start].isalpha():
+            if openers is not None and text[start] in _OPENERS:
+                openers -= 1
+            start += 1
+        elif text[end - 1] in _CLOSERS:
+            if openers is None:
+                openers = _count_openers(text, start, end)
+            if openers:
+                break
+            end -= 1
+        elif not strict and text[end - 1] in _NON_URI_END_CHARS:
+            # The start can't change while we do this, so do it in one go.
+            while start < end and text[end - 1] in _NON_URI_END_CHARS:
+                if openers is not None and text[end - 1] in _OPENERS:
+                    openers -= 1
+                end -= 1
+        else:
+            break
+    return start, end
+
+
+def _count_openers(text, start, end):
+    return text.count('(', start, end) + text.count('[', start, end)
+
+
+def _uri_scheme(text, strict):
+    # Returns the scheme of the URI in the text, or None if it's not a URI.
+    uri = urisplit(text)
+    if not strict and not any([uri.authority, uri.path, uri.query, uri.fragment]):
+        return None
+    return uri.scheme
+
+
+# Classic engine.
+# .............................................................................
+
+def _classic_unsurrounded(text):
+    # Loop in order to handle nested cases.
+    while text.startswith(('(', '[')):
+        if text.startswith('(') and text.endswith(')'):
+            text = text[1:-1]
+        elif text.startswith('[') and text.endswith(']'):
+            text = text[1:-1]
+        else:
+            break
+    return text
+
+
+def _classic_extracted_uri(text, strict = False):
+    # URIs have to begin with a scheme description, which means any character
+    # not allowed in a scheme description can't be part of the start of a URI.
+    # Further, scheme descriptions have to start with an alpha character, so
+    # any other character at the start can be stripped away.  Making this
+    # trickier is that chunks may have URIs nested inside parens or brackets,
+    # so we can't blindly just strip chars from the front and back.
+    while text and (not text[0].isalpha()
+                    or (not strict and text.endswith(_NON_URI_END + (')', ']')))):
+        text = _classic_unsurrounded(text)
+        if not text:
+            break
+        elif not text[0].isalpha():
+            text = text[1:]
+        elif text.endswith((')', ']')) and '(' not in text and '[' not in text:
+            text = text[:-1]
+        elif not strict and text.endswith(_NON_URI_END):
+            text = text[:-1]
+        else:
+            break
+    uri = urisplit(text)
+    if not uri.scheme:
+        return ''
+    if not strict and not any([uri.authority, uri.path, uri.query, uri.fragment]):
+        return ''
+    return text
+
+
+def _classic_uris_in_text(text, strict = False):
+    # Do a first pass of this in case the whole text is surrounded.
+    text = _classic_unsurrounded(text)
+    # 1st replace non-URI special characters like < and > by a space, then
+    # use split(' ') to bust up the text into chunks.
+    chunks = str.translate(text, _SPACE_REPLACEMENTS).split(' ')
+    # Now we have chunks that may be URIs or contain URIs embedded in them.
+    # Examine each chunk and return the URIs found.
+    return list(filter(None, [_classic_extracted_uri(chunk, strict) for chunk in chunks]))
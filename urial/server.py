@@ -0,0 +1,113 @@
+'''
+server.py: long-running Urial server listening on a Unix domain socket
+
+Starting Python and importing Urial's dependencies takes far longer than the
+work of updating a single Finder comment. For callers that invoke urial very
+often (e.g., scripts triggered on every file import), "urial --serve" starts a
+server that keeps the comment backend open, and answers requests sent to it
+by "urial-client" or by any program that can write to a Unix socket.
+
+The protocol is one JSON object per line in each direction. A request has
+the keys "mode", "print", "strict", "uri" and "file", which have the same
+meanings as the corresponding urial command-line options and arguments
+("uri" can be a string or a list of URIs); only "file" is required. The
+reply is a JSON object with the key "file" and either "error" (a message),
+or the result of the operation: "comment" and "uris" for print requests, or
+"uri" and "action" for updates. A connection can be used for any number of
+requests.
+
+Copyright 2024 Michael Hucka.
+
+Licensed under the MIT License – see file "LICENSE" in the project website.
+For more information, please visit https://github.com/mhucka/urial
+'''
+
+import json
+import os
+from   sidetrack import log
+import socket
+import socketserver
+import threading
+
+from   urial.backends import comment_store
+from   urial.comments import processed
+
+
+# Class definitions.
+# .............................................................................
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    '''Answer JSON requests, one per line, until the client disconnects.'''
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            reply = self.server.reply(line)
+            self.wfile.write(json.dumps(reply).encode('utf-8') + b'\n')
+            self.wfile.flush()
+
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    '''Socket server that shares one comment store among all connections.'''
+
+    daemon_threads = True
+
+    def __init__(self, socket_path, store):
+        self.store = store
+        # Backends such as appscript's Finder connection are not thread-safe.
+        self._lock = threading.Lock()
+        super().__init__(socket_path, RequestHandler)
+
+
+    def reply(self, line):
+        '''Carry out the request in the given line of JSON and return a dict.'''
+        file = None
+        try:
+            req = json.loads(line)
+            file = req.get('file', '')
+            mode = (req.get('mode') or 'update').lower()
+            if mode not in ['update', 'append', 'prepend', 'overwrite']:
+                raise ValueError(f'Unrecognized mode value: {mode}')
+            show = (req.get('print') or '').lower()
+            if show not in ['', 'comment', 'uri']:
+                raise ValueError(f'Invalid value for print: {show}')
+            with self._lock:
+                result = processed(self.store, file, req.get('uri'), mode,
+                                   show, bool(req.get('strict')))
+                self.store.flush()
+            return {'file': file, **result}
+        except Exception as ex:             # noqa: PIE786
+            log(f'error processing request {line!r}: {ex}')
+            return {'file': file, 'error': str(ex)}
+
+
+# Principal functions.
+# .............................................................................
+
+def serve(socket_path, backend = 'finder'):
+    '''Listen for requests on the Unix socket at socket_path until stopped.'''
+    if os.path.exists(socket_path):
+        if _server_running(socket_path):
+            raise RuntimeError(f'A server is already listening on {socket_path}')
+        log(f'removing stale socket file {socket_path}')
+        os.unlink(socket_path)
+    store = comment_store(backend)
+    try:
+        with Server(socket_path, store) as server:
+            os.chmod(socket_path, 0o600)
+            log(f'listening on {socket_path} using backend {backend}')
+            server.serve_forever()
+    finally:
+        store.close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+def _server_running(socket_path):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(socket_path)
+            return True
+        except OSError:
+            return False
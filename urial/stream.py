@@ -0,0 +1,121 @@
+'''
+stream.py: find URIs in files of any size, or in the standard input
+
+The functions in urial.scanner need the whole text as one string. The
+functions in this module find the same URIs (applying the same rules) in
+files too big for that, such as multi-gigabyte logs and exports. Regular
+files are memory-mapped, other inputs (such as pipes) are read, and in
+either case the text is scanned in blocks of bounded size. The part of a
+block after its last separator character is carried over to the next block,
+so that URIs that straddle block boundaries are found intact. Memory use is
+therefore proportional to the block size plus the longest run of text
+without separators, no matter how large the input is.
+
+Copyright 2024 Michael Hucka.
+
+Licensed under the MIT License – see file "LICENSE" in the project website.
+For more information, please visit https://github.com/mhucka/urial
+'''
+
+import codecs
+from   itertools import chain
+import os
+import sys
+
+from   urial.scanner import _uri_spans, _LAST_SEPARATOR_RE, _OPENERS, _MATCHING
+
+
+# Constants.
+# .............................................................................
+
+# Number of bytes scanned at a time.
+BLOCK_SIZE = 1 << 20
+
+_OPENER_BYTES = {ord(char) for char in _OPENERS}
+_MATCHING_BYTES = {ord(opener): ord(closer) for opener, closer in _MATCHING.items()}
+
+
+# Principal functions.
+# .............................................................................
+
+def scan_file(path, strict = False, block_size = BLOCK_SIZE, scheme = None):
+    '''Yield the URIs found in the file at path, from first to last.
+
+    The value "-" for path means to read the standard input. The file is
+    assumed to be encoded in UTF-8; invalid bytes are replaced by U+FFFD. The
+    URIs produced are the same as uris_in_text() would return for the whole
+    text of the file, and the values of strict and scheme have the same
+    meanings.
+    '''
+    if path == '-':
+        yield from scan_stream(sys.stdin.buffer, strict, block_size, scheme)
+        return
+    import stat
+    with open(path, 'rb') as f:
+        info = os.fstat(f.fileno())
+        if not stat.S_ISREG(info.st_mode) or info.st_size == 0:
+            yield from scan_stream(f, strict, block_size, scheme)
+            return
+        import mmap
+        with mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ) as data:
+            yield from _scanned_mapping(data, strict, block_size, scheme)
+
+
+def scan_stream(stream, strict = False, block_size = BLOCK_SIZE, scheme = None):
+    '''Yield the URIs found in a binary file object, from first to last.
+
+    This is like scan_file(), but reads the text from a stream (e.g., a pipe)
+    that need not support seeking.
+    '''
+    first = stream.read(block_size)
+    if first and first[0] in _OPENER_BYTES:
+        # A text that begins with ( or [ may be surrounded by parentheses as
+        # a whole (and if so, they're removed), but that depends on how the
+        # text ends. Save it to a temporary file, so its end can be examined.
+        import mmap
+        import shutil
+        import tempfile
+        with tempfile.TemporaryFile() as tmp:
+            tmp.write(first)
+            shutil.copyfileobj(stream, tmp)
+            tmp.flush()
+            with mmap.mmap(tmp.fileno(), 0, access = mmap.ACCESS_READ) as data:
+                yield from _scanned_mapping(data, strict, block_size, scheme)
+        return
+    blocks = chain([first], iter(lambda: stream.read(block_size), b''))
+    yield from _scanned_blocks(blocks, strict, scheme)
+
+
+# Miscellaneous helpers.
+# .............................................................................
+
+def _scanned_mapping(data, strict, block_size, scheme):
+    # Do the equivalent of scanner._unsurrounded_span() on the whole text.
+    # The characters involved are ASCII, so this can be done on the bytes.
+    start, end = 0, len(data)
+    while start < end and data[start] in _OPENER_BYTES:
+        if data[end - 1] != _MATCHING_BYTES[data[start]]:
+            break
+        start += 1
+        end -= 1
+    blocks = (data[i:min(i + block_size, end)] for i in range(start, end, block_size))
+    yield from _scanned_blocks(blocks, strict, scheme)
+
+
+def _scanned_blocks(blocks, strict, scheme):
+    decoder = codecs.getincrementaldecoder('utf-8')(errors = 'replace')
+    carried = ''
+    for block in blocks:
+        text = carried + decoder.decode(block)
+        # Only scan up to the last separator; the rest may continue in the
+        # next block. There's no separator in the carried-over part.
+        if match := _LAST_SEPARATOR_RE.match(text, len(carried)):
+            cut = match.end()
+            for start, end, _ in _uri_spans(text, strict, 0, cut, False, scheme):
+                yield text[start:end]
+            carried = text[cut:]
+        else:
+            carried = text
+    text = carried + decoder.decode(b'', final = True)
+    for start, end, _ in _uri_spans(text, strict, whole = False, scheme = scheme):
+        yield text[start:end]
@@ -0,0 +1,179 @@
+'''
+timing.py: record how long the phases of a run take, and count events
+
+Besides the PhaseTimer class, this module provides a way to count events in
+the busiest code paths (such as the number of chunks of text examined by the
+URI scanner) at little cost: nothing is counted unless start_counting() has
+been called, and code that counts things checks the module variable
+"counters" once per call rather than once per event.
+
+Copyright 2024 Michael Hucka.
+
+Licensed under the MIT License – see file "LICENSE" in the project website.
+For more information, please visit https://github.com/mhucka/urial
+'''
+
+from   collections import Counter
+import threading
+from   time import perf_counter
+
+from   urial.backends import CommentStore
+
+
+# Global variables.
+# .............................................................................
+
+# Counts of events, or None if events are not being counted.
+counters = None
+
+_lock = threading.Lock()
+
+
+# Class definitions.
+# .............................................................................
+
+class PhaseTimer():
+    '''Accumulate the time spent in named phases of a run.
+
+    Each call to mark(phase) attributes the time elapsed since the previous
+    call (or since the start time given to the constructor) to the named
+    phase. Phases can be marked more than once; their times are added up.
+    '''
+
+    def __init__(self, start = None):
+        self.start = perf_counter() if start is None else start
+        self.phases = {}
+        self._last = self.start
+
+
+    def mark(self, phase, now = None):
+        '''Attribute the time since the last mark to the given phase.'''
+        now = perf_counter() if now is None else now
+        self.phases[phase] = self.phases.get(phase, 0) + (now - self._last)
+        self._last = now
+
+
+    def total(self):
+        '''Return the time elapsed between the start and the last mark.'''
+        return self._last - self.start
+
+
+    def summary(self):
+        '''Return a one-line summary of the phase times in milliseconds.'''
+        parts = [f'{phase} {secs*1000:.1f} ms' for phase, secs in self.phases.items()]
+        return ', '.join(parts + [f'total {self.total()*1000:.1f} ms'])
+
+
+    def as_dict(self):
+        '''Return a dict of the phase times (and total) in milliseconds.'''
+        return {**{phase: round(secs*1000, 3) for phase, secs in self.phases.items()},
+                'total': round(self.total()*1000, 3)}
+
+
+class InstrumentedStore(CommentStore):
+    '''Wrap a CommentStore object to count and time reads and writes.
+
+    The counts are added to the module variable "counters" under the names
+    "comments_read" and "comments_written", and the time spent in each kind
+    of operation under the names "read_seconds" and "write_seconds". When
+    comments are read by several threads at once, the times are summed over
+    the threads, and so can add up to more than the time that elapsed.
+    '''
+
+    def __init__(self, store):
+        self.store = store
+        self.batch_size = store.batch_size
+
+
+    def read(self, file):
+        start = perf_counter()
+        try:
+            return self.store.read(file)
+        finally:
+            count('comments_read', 1, 'read_seconds', perf_counter() - start)
+
+
+    def write(self, file, comment):
+        start = perf_counter()
+        try:
+            self.store.write(file, comment)
+        finally:
+            count('comments_written', 1, 'write_seconds', perf_counter() - start)
+
+
+    def read_many(self, files):
+        start = perf_counter()
+        try:
+            return self.store.read_many(files)
+        finally:
+            count('comments_read', len(files), 'read_seconds', perf_counter() - start)
+
+
+    def write_many(self, pairs):
+        start = perf_counter()
+        try:
+            return self.store.write_many(pairs)
+        finally:
+            count('comments_written', len(pairs), 'write_seconds', perf_counter() - start)
+
+
+    def prepare_thread(self):
+        self.store.prepare_thread()
+
+
+    def flush(self):
+        start = perf_counter()
+        try:
+            self.store.flush()
+        finally:
+            count('write_seconds', perf_counter() - start)
+
+
+    def close(self):
+        self.store.close()
+
+
+# Miscellaneous utilities.
+# .............................................................................
+
+def start_counting():
+    '''Start counting events, discarding any counts made previously.'''
+    global counters
+    counters = Counter()
+
+
+def stop_counting():
+    '''Stop counting events, and return the counts accumulated so far.'''
+    global counters
+    counted, counters = counters, None
+    return counted
+
+
+def count(*names_and_amounts):
+    '''Add amounts to counters, given as pairs of arguments (name, amount).
+
+    Does nothing if start_counting() has not been called.
+    '''
+    if counters is None:
+        return
+    with _lock:
+        for i in range(0, len(names_and_amounts), 2):
+            counters[names_and_amounts[i]] += names_and_amounts[i + 1]
+
+
+def metrics_record(timer, counted, **fields):
+    '''Return a dict summarizing the phase times and counts of a run.
+
+    The value of timer must be a PhaseTimer object and counted a dict of
+    counts such as returned by stop_counting(). Durations are given in
+    milliseconds. Any additional keyword arguments are included as-is.
+    '''
+    from datetime import datetime, timezone
+    counted = dict(counted or {})
+    durations = {name[:-len('_seconds')]: round(counted.pop(name)*1000, 3)
+                 for name in sorted(counted) if name.endswith('_seconds')}
+    return {'time': datetime.now(timezone.utc).isoformat(timespec = 'seconds'),
+            **fields,
+            'phases_ms': timer.as_dict(),
+            'io_ms': durations,
+            'counters': counted}
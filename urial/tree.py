@@ -0,0 +1,108 @@
+'''
+tree.py: find files in directory trees and read their comments concurrently
+
+Reading a Finder comment takes little computation but a comparatively long
+time waiting for Finder (or the file system) to respond, so reading the
+comments of many files is much faster when several reads are in progress at
+the same time. The functions in this module walk directory trees lazily and
+read comments using a bounded pool of threads, so that memory use stays
+constant no matter how many files there are.
+
+Copyright 2024 Michael Hucka.
+
+Licensed under the MIT License – see file "LICENSE" in the project website.
+For more information, please visit https://github.com/mhucka/urial
+'''
+
+from   fnmatch import fnmatch
+import os
+
+
+# Principal functions.
+# .............................................................................
+
+def files_in(root, include = None, exclude = None):
+    '''Yield the paths of the files in the directory tree rooted at root.
+
+    If include is given, it must be a list of glob patterns; only files that
+    match at least one of them are returned. If exclude is given, files and
+    directories that match any of its patterns are skipped (and directories
+    are not descended into). A pattern containing a "/" is matched against
+    the path relative to root; other patterns are matched against the name.
+    Symbolic links to directories are not followed. If root is a file, it is
+    returned as-is.
+    '''
+    if not os.path.isdir(root):
+        yield root
+        return
+    # Offset of relative paths within the full paths returned by scandir.
+    prefix_length = len(os.path.join(root, ''))
+    # Use an explicit stack rather than recursion so that deep trees are ok.
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as entries:
+                # Sort so that the order of results is reproducible.
+                entries = sorted(entries, key = lambda entry: entry.name)
+        except OSError:
+            continue
+        subdirectories = []
+        for entry in entries:
+            relative = entry.path[prefix_length:]
+            if exclude and _matches(entry.name, relative, exclude):
+                continue
+            if entry.is_dir(follow_symlinks = False):
+                subdirectories.append(entry.path)
+            elif not include or _matches(entry.name, relative, include):
+                yield entry.path
+        stack.extend(reversed(subdirectories))
+
+
+def comments_of(store, files, workers = 8):
+    '''Read the comments of the given files using a pool of threads.
+
+    The value of store must be a CommentStore object (see backends.py), and
+    files can be any iterable of paths, including a generator; it is consumed
+    lazily, and at most a few times "workers" reads are pending at any time.
+    If the store can read several comments at once (i.e., its batch_size is
+    greater than 1), each thread reads a batch of comments at a time.
+    Yields (file, comment, error) tuples in the order in which the reads
+    finish, where error is None or the exception raised for that file.
+    '''
+    from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+    with ThreadPoolExecutor(max_workers = workers,
+                            initializer = store.prepare_thread) as pool:
+        pending = set()
+        for batch in _batches(files, store.batch_size):
+            pending.add(pool.submit(_read, store, batch))
+            if len(pending) >= 4 * workers:
+                done, pending = wait(pending, return_when = FIRST_COMPLETED)
+                yield from (result for future in done for result in future.result())
+        while pending:
+            done, pending = wait(pending, return_when = FIRST_COMPLETED)
+            yield from (result for future in done for result in future.result())
+
+
+# Miscellaneous helpers.
+# .............................................................................
+
+def _matches(name, relative_path, patterns):
+    return any(fnmatch(relative_path if '/' in pattern else name, pattern)
+               for pattern in patterns)
+
+
+def _batches(files, size):
+    batch = []
+    for file in files:
+        batch.append(file)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _read(store, files):
+    return [(file, comment, error)
+            for file, (comment, error) in zip(files, store.read_many(files))]